@@ -6,5 +6,9 @@ __version__ = '0.0.11'
 
 from .hagerstrand import *
 from .dataprocess import *
+from .spatial import *
+from .diffusion import *
+from .accessibility import *
+from .trajectory import *
 from .common import *
 from .utils import *
\ No newline at end of file
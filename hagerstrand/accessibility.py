@@ -0,0 +1,422 @@
+"""A module of spatial interaction and accessibility models over origin-destination cost matrices, e.g. CBG to store drive times."""
+
+import os
+import numpy as np
+import pandas as pd
+
+
+def od_matrix(
+    table,
+    origin_col="CBG",
+    destination_col="DestinationID",
+    cost_col="Total_TravelTime",
+    max_cost=None,
+    origins=None,
+    destinations=None,
+):
+    """Build a sparse origin-destination cost matrix from a long table such as cbg_store_drivetime.csv.
+
+    Args:
+        table (str|pd.DataFrame): The file path to a CSV or a pd.DataFrame with one row per origin-destination pair.
+        origin_col (str, optional): Column of origin labels, read as str so CBG GEOIDs match those of dataprocess.visitor_matrix. Defaults to 'CBG'.
+        destination_col (str, optional): Column of destination labels. Defaults to 'DestinationID'.
+        cost_col (str, optional): Column of travel costs. Defaults to 'Total_TravelTime'.
+        max_cost (float, optional): Pairs with a larger cost are left out. Defaults to None; keeps every pair.
+        origins (list|pd.Index, optional): Labels, and order, of the matrix rows. Defaults to None; the sorted origins of the table.
+        destinations (list|pd.Index, optional): Labels, and order, of the matrix columns. Defaults to None; the sorted destinations of the table.
+
+    Raises:
+        FileNotFoundError: If the provided file path does not exist.
+        TypeError: If the table is not a str or pd.DataFrame.
+
+    Returns:
+        tuple: A scipy.sparse.csr_matrix of costs, a pd.Index of the origin labels of its rows and a pd.Index of the destination labels of its columns. Pairs absent from the matrix are unreachable, not free.
+    """
+    from scipy import sparse
+
+    if isinstance(table, str):
+        if not os.path.exists(table):
+            raise FileNotFoundError("The provided csv could not be found.")
+        table = pd.read_csv(
+            table,
+            usecols=[origin_col, destination_col, cost_col],
+            dtype={origin_col: str},
+            encoding="utf-8-sig",
+        )
+    elif isinstance(table, pd.DataFrame):
+        table = table[[origin_col, destination_col, cost_col]].copy()
+        table[origin_col] = table[origin_col].astype(str)
+    else:
+        raise TypeError("The table must be a type of str or pd.DataFrame.")
+
+    if max_cost is not None:
+        table = table[table[cost_col] <= max_cost]
+
+    origins = pd.Index(np.sort(table[origin_col].unique()) if origins is None else origins)
+    destinations = pd.Index(np.sort(table[destination_col].unique()) if destinations is None else destinations)
+    row = origins.get_indexer(table[origin_col])
+    col = destinations.get_indexer(table[destination_col])
+    keep = (row >= 0) & (col >= 0)
+    costs = table[cost_col].to_numpy(dtype=np.float64)[keep]
+    matrix = sparse.csr_matrix((costs, (row[keep], col[keep])), shape=(len(origins), len(destinations)))
+    matrix.sum_duplicates()
+    return matrix, origins, destinations
+
+
+def align_flows(matrix, rows, cols, origins, destinations):
+    """Move observed flows, e.g. the transposed matrix of dataprocess.visitor_matrix, onto the origins and destinations of a cost matrix.
+
+    Flows whose labels are repeated are summed and those whose labels are not among the origins or destinations are dropped.
+
+    Args:
+        matrix (scipy.sparse.spmatrix): The observed flows.
+        rows (pd.Index): The origin labels of the rows of the flows.
+        cols (pd.Index): The destination labels of the columns of the flows.
+        origins (pd.Index): The origin labels of the cost matrix.
+        destinations (pd.Index): The destination labels of the cost matrix.
+
+    Returns:
+        scipy.sparse.csr_matrix: The flows with the shape of the cost matrix.
+    """
+    from .dataprocess import _reindex_sparse
+
+    return _reindex_sparse(matrix, pd.Index(rows), pd.Index(cols), pd.Index(origins), pd.Index(destinations))
+
+
+def huff_model(cost, attractiveness, alpha=1.0, beta=2.0, kernel="power", min_cost=None, block_size=65536):
+    """Compute Huff model probabilities, the expected share of the trips of each origin going to each destination.
+
+    The probability of origin i choosing destination j is A_j ** alpha * f(c_ij), divided by its sum over the destinations reachable from i.
+
+    Args:
+        cost (np.array|scipy.sparse.spmatrix): Matrix of shape (origins, destinations) of travel costs. For a sparse matrix, absent pairs are unreachable; for an array, np.inf is unreachable.
+        attractiveness (np.array): The attractiveness of each destination, e.g. floor area or number of reviews.
+        alpha (float, optional): The exponent of attractiveness. Defaults to 1.0.
+        beta (float, optional): The distance decay parameter. Defaults to 2.0.
+        kernel (str, optional): The distance decay f; 'power' (c ** -beta) or 'exponential' (exp(-beta * c)). Defaults to 'power'.
+        min_cost (float, optional): Costs below this are raised to it, so a cost of 0 does not take the whole share under the power kernel. Defaults to None; half the smallest positive cost.
+        block_size (int, optional): Number of origins processed at a time, which caps the memory of temporaries. Defaults to 65536.
+
+    Raises:
+        ValueError: If the kernel is not recognized or attractiveness does not match the destinations.
+
+    Returns:
+        np.array|scipy.sparse.csr_matrix: The probabilities, in the format of cost; rows of origins with no reachable destination are 0.
+    """
+    from scipy import sparse
+
+    log_attr = _log_attractiveness(cost, attractiveness)
+    min_cost = _min_cost(cost, min_cost)
+    blocks = []
+    for start in range(0, cost.shape[0], block_size):
+        block = cost[start:start + block_size]
+        prob, _ = _huff_block(block, log_attr, alpha, beta, kernel, min_cost)
+        blocks.append(prob)
+    if sparse.issparse(cost):
+        return sparse.vstack(blocks, format="csr") if blocks else sparse.csr_matrix(cost.shape)
+    return np.vstack(blocks) if blocks else np.zeros(cost.shape)
+
+
+def calibrate_huff(
+    cost,
+    attractiveness,
+    observed,
+    alpha=1.0,
+    beta=2.0,
+    kernel="power",
+    min_cost=None,
+    fit_alpha=True,
+    bounds=((0, 10), (0, 10)),
+    block_size=65536,
+):
+    """Calibrate the parameters of the Huff model by maximum likelihood against observed flows, e.g. SafeGraph visitor_home_cbgs counts.
+
+    The log-likelihood of the observed trips and its gradient are accumulated over blocks of origins. Observed flows to pairs that are unreachable in the cost matrix are ignored.
+
+    Args:
+        cost (np.array|scipy.sparse.spmatrix): Matrix of shape (origins, destinations) of travel costs, as in huff_model.
+        attractiveness (np.array): The attractiveness of each destination.
+        observed (np.array|scipy.sparse.spmatrix): Matrix of observed flows with the shape of cost, e.g. from align_flows.
+        alpha (float, optional): The starting exponent of attractiveness. Defaults to 1.0.
+        beta (float, optional): The starting distance decay parameter. Defaults to 2.0.
+        kernel (str, optional): The distance decay f, as in huff_model. Defaults to 'power'.
+        min_cost (float, optional): The smallest cost, as in huff_model. Defaults to None.
+        fit_alpha (bool, optional): Whether alpha is calibrated; otherwise only beta is. Defaults to True.
+        bounds (tuple, optional): The (low, high) bounds of alpha and of beta. Defaults to ((0, 10), (0, 10)).
+        block_size (int, optional): Number of origins processed at a time. Defaults to 65536.
+
+    Raises:
+        ValueError: If observed does not have the shape of cost.
+
+    Returns:
+        dict: The calibrated 'alpha' and 'beta', the 'log_likelihood' at them and whether the optimizer 'converged'.
+    """
+    from scipy import sparse
+    from scipy.optimize import minimize
+
+    if observed.shape != cost.shape:
+        raise ValueError("The observed flows must have the shape of the cost matrix.")
+
+    log_attr = _log_attractiveness(cost, attractiveness)
+    min_cost = _min_cost(cost, min_cost)
+    observed = sparse.csr_matrix(observed) if sparse.issparse(cost) else np.asarray(observed, dtype=np.float64)
+    # Destinations without attractiveness are never chosen and do not move alpha
+    attr_grad = np.where(np.isfinite(log_attr), log_attr, 0)
+
+    def objective(params):
+        a, b = (params[0], params[1]) if fit_alpha else (alpha, params[0])
+        log_likelihood = 0.0
+        gradient = np.zeros(2)
+        for start in range(0, cost.shape[0], block_size):
+            stop = start + block_size
+            block = cost[start:stop]
+            prob, decay_grad = _huff_block(block, log_attr, a, b, kernel, min_cost)
+            if sparse.issparse(block):
+                block = sparse.csr_matrix(block)
+                flows = _values_at(observed[start:stop], block)
+                totals = np.repeat(_row_reduce(np.add, flows, block.indptr), np.diff(block.indptr))
+                probs = prob.data
+                attr = attr_grad[block.indices]
+            else:
+                flows = np.where(np.isfinite(block), observed[start:stop], 0)
+                totals = flows.sum(axis=1, keepdims=True)
+                probs = prob
+                attr = attr_grad[None, :]
+            positive = flows > 0
+            log_likelihood += np.sum(flows[positive] * np.log(probs[positive]))
+            residual = flows - totals * probs
+            gradient += [np.sum(residual * attr), np.sum(residual * decay_grad)]
+        if not fit_alpha:
+            gradient = gradient[1:]
+        return -log_likelihood, -gradient
+
+    start_params = [alpha, beta] if fit_alpha else [beta]
+    result = minimize(
+        objective,
+        start_params,
+        jac=True,
+        method="L-BFGS-B",
+        bounds=list(bounds) if fit_alpha else [bounds[1]],
+    )
+    fitted = result.x if fit_alpha else [alpha, result.x[0]]
+    return {
+        "alpha": float(fitted[0]),
+        "beta": float(fitted[1]),
+        "log_likelihood": float(-result.fun),
+        "converged": bool(result.success),
+    }
+
+
+def _log_attractiveness(cost, attractiveness):
+    """Validate attractiveness against the destinations and take its log."""
+    attractiveness = np.asarray(attractiveness, dtype=np.float64)
+    if attractiveness.shape != (cost.shape[1],):
+        raise ValueError("There must be one attractiveness value per destination.")
+    with np.errstate(divide="ignore"):
+        return np.log(attractiveness)
+
+
+def _min_cost(cost, min_cost):
+    """Default the smallest cost to half the smallest positive cost."""
+    from scipy import sparse
+
+    if min_cost is not None:
+        return min_cost
+    values = cost.data if sparse.issparse(cost) else np.asarray(cost).ravel()
+    positive = values[(values > 0) & np.isfinite(values)]
+    return positive.min() / 2 if positive.size else 1.0
+
+
+def _log_decay(costs, beta, kernel):
+    """The log of the distance decay of costs and its derivative by beta."""
+    if kernel == "power":
+        log_costs = np.log(costs)
+        return -beta * log_costs, -log_costs
+    if kernel == "exponential":
+        return -beta * costs, -costs
+    raise ValueError("The kernel must be either 'power' or 'exponential'.")
+
+
+def _huff_block(block, log_attr, alpha, beta, kernel, min_cost):
+    """Huff probabilities of a block of origins and the derivative of their log decay by beta, in the layout of the block."""
+    from scipy import sparse
+
+    if sparse.issparse(block):
+        block = sparse.csr_matrix(block)
+        log_decay, decay_grad = _log_decay(np.maximum(block.data, min_cost), beta, kernel)
+        log_weights = alpha * log_attr[block.indices] + log_decay
+        # Subtract the largest log weight of each row before exponentiating
+        counts = np.diff(block.indptr)
+        row_max = _row_reduce(np.maximum, log_weights, block.indptr)
+        row_max[~np.isfinite(row_max)] = 0
+        weights = np.exp(log_weights - np.repeat(row_max, counts))
+        totals = np.repeat(_row_reduce(np.add, weights, block.indptr), counts)
+        data = np.divide(weights, totals, out=np.zeros_like(weights), where=totals > 0)
+        return sparse.csr_matrix((data, block.indices, block.indptr), shape=block.shape), decay_grad
+
+    block = np.asarray(block, dtype=np.float64)
+    reachable = np.isfinite(block)
+    costs = np.where(reachable, np.maximum(block, min_cost), 1.0)
+    log_decay, decay_grad = _log_decay(costs, beta, kernel)
+    log_weights = np.where(reachable, alpha * log_attr[None, :] + log_decay, -np.inf)
+    row_max = log_weights.max(axis=1, keepdims=True)
+    row_max[~np.isfinite(row_max)] = 0
+    weights = np.exp(log_weights - row_max)
+    totals = weights.sum(axis=1, keepdims=True)
+    prob = np.divide(weights, totals, out=np.zeros_like(weights), where=totals > 0)
+    return prob, np.where(reachable, decay_grad, 0)
+
+
+def _row_reduce(ufunc, values, indptr):
+    """Reduce the values of each row of a csr layout with a ufunc; empty rows are 0."""
+    counts = np.diff(indptr)
+    result = np.zeros(len(counts))
+    nonempty = counts > 0
+    if nonempty.any():
+        result[nonempty] = ufunc.reduceat(values, indptr[:-1][nonempty])
+    return result
+
+
+def _values_at(matrix, pattern):
+    """The values of a sparse matrix at the stored entries of a csr pattern, in the order of the pattern."""
+    rows = np.repeat(np.arange(pattern.shape[0]), np.diff(pattern.indptr))
+    return np.asarray(matrix[rows, pattern.indices], dtype=np.float64).ravel()
+
+
+def catchment_matrix(left_gdf, right_gdf, radius, metric="euclidean", **kwargs):
+    """Build a sparse origin-destination distance matrix of the destinations within a radius of each origin, e.g. stores within X miles of each CBG centroid.
+
+    Args:
+        left_gdf (gpd.GeoDataFrame): The origin points; rows of the matrix.
+        right_gdf (gpd.GeoDataFrame): The destination points; columns of the matrix.
+        radius (float): The search radius, in the units of the projection for euclidean and miles for haversine.
+        metric (str, optional): The measure of distance, "euclidean" or "haversine". Defaults to "euclidean".
+        **kwargs: Other arguments of hagerstrand.radius_neighbors, e.g. index or chunksize.
+
+    Returns:
+        scipy.sparse.csr_matrix: Matrix of shape (len(left_gdf), len(right_gdf)) of distances; pairs farther than the radius are absent.
+    """
+    from scipy import sparse
+    from .hagerstrand import radius_neighbors
+
+    indptr, indices, distances = radius_neighbors(left_gdf, right_gdf, radius, metric=metric, **kwargs)
+    return sparse.csr_matrix((distances, indices, indptr), shape=(len(left_gdf), len(right_gdf)))
+
+
+def distance_decay(cost, threshold, kernel="binary", beta=1.0, steps=None):
+    """Weight the pairs of a sparse cost matrix within a threshold by a distance decay kernel, for floating catchment area methods.
+
+    Args:
+        cost (scipy.sparse.spmatrix|np.array): Matrix of travel costs; for an array, np.inf is unreachable.
+        threshold (float): The catchment size; pairs with a larger cost get no weight.
+        kernel (str, optional): 'binary' (1, the original 2SFCA), 'gaussian' (the gaussian 2SFCA of Dai, 0 at the threshold), 'linear' (1 - c / threshold), 'exponential' (exp(-beta * c)) or 'stepwise' (the E2SFCA of Luo and Qi). Defaults to 'binary'.
+        beta (float, optional): The decay parameter of the exponential kernel. Defaults to 1.0.
+        steps (list, optional): The (upper cost, weight) of each zone of the stepwise kernel. Defaults to None; thirds of the threshold weighted 1.0, 0.68 and 0.22.
+
+    Raises:
+        ValueError: If the kernel is not recognized.
+
+    Returns:
+        scipy.sparse.csr_matrix: The weights, keeping only the pairs within the threshold.
+    """
+    from scipy import sparse
+
+    if sparse.issparse(cost):
+        cost = sparse.csr_matrix(cost)
+    else:
+        cost = np.asarray(cost, dtype=np.float64)
+        rows, cols = np.nonzero(np.isfinite(cost))
+        cost = sparse.csr_matrix((cost[rows, cols], (rows, cols)), shape=cost.shape)
+    costs = cost.data
+
+    if kernel == "binary":
+        weights = np.ones_like(costs)
+    elif kernel == "gaussian":
+        floor = np.exp(-0.5)
+        weights = (np.exp(-0.5 * (costs / threshold) ** 2) - floor) / (1 - floor)
+    elif kernel == "linear":
+        weights = 1 - costs / threshold
+    elif kernel == "exponential":
+        weights = np.exp(-beta * costs)
+    elif kernel == "stepwise":
+        if steps is None:
+            steps = [(threshold / 3, 1.0), (2 * threshold / 3, 0.68), (threshold, 0.22)]
+        bounds, step_weights = (np.asarray(values, dtype=np.float64) for values in zip(*steps))
+        zone = np.searchsorted(bounds, costs, side="left")
+        weights = np.append(step_weights, 0)[zone]
+    else:
+        raise ValueError("The kernel must be 'binary', 'gaussian', 'linear', 'exponential' or 'stepwise'.")
+
+    weights = np.where(costs <= threshold, weights, 0)
+    result = sparse.csr_matrix((weights, cost.indices.copy(), cost.indptr.copy()), shape=cost.shape)
+    result.eliminate_zeros()
+    return result
+
+
+class FloatingCatchment:
+    """A two-step floating catchment area (2SFCA) model whose weights are computed once, so scores under new supply and demand scenarios each cost two sparse matrix-vector products.
+
+    The enhanced 2SFCA (E2SFCA) is the 'stepwise' kernel and the gaussian 2SFCA the 'gaussian' kernel.
+
+    Args:
+        cost (scipy.sparse.spmatrix|np.array): Matrix of shape (origins, destinations) of travel costs, e.g. from od_matrix or catchment_matrix.
+        threshold (float): The catchment size, in the units of cost.
+        kernel (str, optional): The distance decay kernel, as in distance_decay. Defaults to 'binary'.
+        beta (float, optional): The decay parameter of the exponential kernel. Defaults to 1.0.
+        steps (list, optional): The (upper cost, weight) zones of the stepwise kernel. Defaults to None.
+    """
+
+    def __init__(self, cost, threshold, kernel="binary", beta=1.0, steps=None):
+        self.threshold = threshold
+        self.kernel = kernel
+        self.weights = distance_decay(cost, threshold, kernel=kernel, beta=beta, steps=steps)
+        self._weights_t = self.weights.T.tocsr()
+
+    @property
+    def shape(self):
+        return self.weights.shape
+
+    def supply_ratios(self, supply, demand):
+        """Step one; the ratio of the supply of each destination to the weighted demand within its catchment.
+
+        Args:
+            supply (np.array): The supply of each destination, e.g. store floor area.
+            demand (np.array): The demand of each origin, e.g. CBG population.
+
+        Returns:
+            np.array: The supply to demand ratio of each destination; 0 where no demand is within the catchment.
+        """
+        demand = np.asarray(demand, dtype=np.float64)
+        supply = np.asarray(supply, dtype=np.float64)
+        catchment_demand = self._weights_t @ demand
+        return np.divide(supply, catchment_demand, out=np.zeros_like(catchment_demand), where=catchment_demand > 0)
+
+    def scores(self, supply, demand):
+        """Step two; the accessibility of each origin, the weighted sum of the supply ratios of the destinations within its catchment.
+
+        Args:
+            supply (np.array): The supply of each destination.
+            demand (np.array): The demand of each origin.
+
+        Returns:
+            np.array: The accessibility score of each origin.
+        """
+        return self.weights @ self.supply_ratios(supply, demand)
+
+
+def two_step_fca(cost, supply, demand, threshold, kernel="binary", beta=1.0, steps=None):
+    """Compute two-step floating catchment area (2SFCA, or E2SFCA with the 'stepwise' kernel) accessibility scores, e.g. food access of each CBG.
+
+    Args:
+        cost (scipy.sparse.spmatrix|np.array): Matrix of shape (origins, destinations) of travel costs.
+        supply (np.array): The supply of each destination.
+        demand (np.array): The demand of each origin.
+        threshold (float): The catchment size, in the units of cost.
+        kernel (str, optional): The distance decay kernel, as in distance_decay. Defaults to 'binary'.
+        beta (float, optional): The decay parameter of the exponential kernel. Defaults to 1.0.
+        steps (list, optional): The (upper cost, weight) zones of the stepwise kernel. Defaults to None.
+
+    Returns:
+        np.array: The accessibility score of each origin.
+    """
+    return FloatingCatchment(cost, threshold, kernel=kernel, beta=beta, steps=steps).scores(supply, demand)
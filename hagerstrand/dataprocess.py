@@ -1,3 +1,5 @@
+import os
+import functools
 import pandas as pd
 import json
 import ipywidgets as widgets
@@ -18,57 +20,150 @@ class ExtendedDataFrame(pd.DataFrame):
     def _constructor(self):
         return ExtendedDataFrame
 
-    def deduplicate(self, columns=None):
+    def deduplicate(self, columns=None, keep="first", order_by=None, normalize=None, hashed=False):
         """Drops duplicate records and resets the index of the ExtendedDataFrame
 
         Args:
             columns (list, optional): Columns for which to identify dupulicate records. Defaults to None.
+            keep (str, optional): Keep the 'first' or 'last' duplicate; with order_by, the one with the smallest or largest order_by value. Defaults to 'first'.
+            order_by (str, optional): Column ranking the duplicates, e.g. 'date_range_end'. Defaults to None.
+            normalize (list, optional): Text columns normalized before comparing, e.g. ['customer_FullAddress']. Defaults to None.
+            hashed (bool, optional): A flag indicating whether to compare 64-bit row fingerprints (see deduplicate_hashed), which is implied by order_by and normalize. Defaults to False.
 
         Returns:
             ExtendedDataFrame: A de-deuplicated ExtendedDataFrame with the index reset.
         """
-        if columns == None:
-            df = self.drop_duplicates()
+        if hashed or order_by is not None or normalize is not None:
+            df, _ = deduplicate_hashed(
+                self, columns=columns, keep=keep, order_by=order_by, normalize=normalize
+            )
+            df = df.reset_index(drop=True)
+            return df
+        elif columns == None:
+            df = self.drop_duplicates(keep=keep)
             df = df.reset_index(drop=True)
             return df
         else:
-            df = self.drop_duplicates(subset=columns)
+            df = self.drop_duplicates(subset=columns, keep=keep)
             df = df.reset_index(drop=True)
             return df
 
-    def jsoncol_newdf(self):
+    def jsoncol_newdf(self, engine="columnar", n_jobs=1):
         """Unpack a JSON column and return a new ExtendedDataFrame
 
+        Args:
+            engine (str, optional): Unpacking engine, either 'columnar' or 'python'. Defaults to 'columnar'.
+            n_jobs (int, optional): Number of worker processes; -1 uses all cores. Defaults to 1.
+
         Returns:
             ExtendedDataFrame: A new ExtendedDataFrame of an unpacked JSON column.
         """
-        df = unpack_json(self)
+        df = unpack_json(self, engine=engine, n_jobs=n_jobs)
         return df
 
-    def jsoncol_merge(self):
+    def jsoncol_merge(self, engine="columnar", n_jobs=1, lazy=False):
         """Unpack a JSON column and merge to the existing DataFrame
 
+        Args:
+            engine (str, optional): Unpacking engine, either 'columnar' or 'python'. Defaults to 'columnar'.
+            n_jobs (int, optional): Number of worker processes; -1 uses all cores. Defaults to 1.
+            lazy (bool, optional): A flag indicating whether to return an UnpackedJoin that joins the columns on request. Defaults to False.
+
+        Returns:
+            ExtendedDataFrame|UnpackedJoin: A new ExtendedDataFrame that includes the original DataFrame and the unpacked JSON column, or an UnpackedJoin if lazy is True.
+        """
+        df = unpack_json_and_merge(self, engine=engine, n_jobs=n_jobs, lazy=lazy)
+        return df
+
+    def jsoncol_array(self, json_column="visits_by_day", dtype="int32", fill_value=0):
+        """Parse an array- or dict-valued JSON column into a dense 2-D array aligned with the index of the ExtendedDataFrame
+
+        Args:
+            json_column (str, optional): JSON column to be parsed, e.g. 'visits_by_day', 'popularity_by_hour', 'popularity_by_day' or 'bucketed_dwell_times'. Defaults to 'visits_by_day'.
+            dtype (str, optional): dtype of the output array. Defaults to 'int32'.
+            fill_value (int, optional): Value used for missing rows and padding. Defaults to 0.
+
+        Returns:
+            tuple: A np.array of shape (n_rows, width) whose i-th row belongs to the i-th index label, and the list of dict keys naming its columns, the union of the keys of all rows (None for array-valued columns).
+        """
+        return json_array(self, json_column=json_column, dtype=dtype, fill_value=fill_value)
+
+    def compact(self, category_threshold=0.5):
+        """Downcast integer columns and encode repeated string columns (e.g. poi_cbg, brands) as Categoricals, printing the memory saved
+
+        Args:
+            category_threshold (float, optional): String columns whose share of unique values is at most this are encoded as Categoricals. Defaults to 0.5.
+
         Returns:
-            ExtendedDataFrame: A new ExtendedDataFrame that includes the original DataFrame and the unpacked JSON column.
+            ExtendedDataFrame: A compacted ExtendedDataFrame.
         """
-        df = unpack_json_and_merge(self)
+        df, _ = compact_dtypes(self, category_threshold=category_threshold)
         return df
 
 
 # THE FOLLOWING FUNCTIONS ARE MODIFIED FROM https://github.com/SafeGraphInc/safegraph_py
 
 
-def load_json_nan(df, json_col):
+@functools.lru_cache(maxsize=None)
+def json_decoder(backend="auto", cache_size=None):
+    """Get a function decoding JSON strings with the fastest installed backend.
+
+    Decoders are created once per (backend, cache_size) pair, so a memo cache is shared by every call and column using it.
+
+    Args:
+        backend (str, optional): One of 'auto', 'orjson', 'simdjson' or 'json'. 'auto' tries orjson, then simdjson, then falls back to the standard library. Defaults to 'auto'.
+        cache_size (int, optional): Number of decoded strings to memoize, keyed on the raw string. Decoded objects are shared between identical strings and should not be mutated. Defaults to None; no cache.
+
+    Raises:
+        ValueError: If the backend is not recognized.
+        ImportError: If the requested backend is not installed.
+
+    Returns:
+        function: A function decoding a JSON string into Python objects.
+    """
+    if backend not in ("auto", "orjson", "simdjson", "json"):
+        raise ValueError("The backend must be one of 'auto', 'orjson', 'simdjson' or 'json'.")
+
+    loads = None
+    if backend in ("auto", "orjson"):
+        try:
+            import orjson
+
+            loads = orjson.loads
+        except ImportError:
+            if backend == "orjson":
+                raise
+    if loads is None and backend in ("auto", "simdjson"):
+        try:
+            import simdjson
+
+            loads = simdjson.loads
+        except ImportError:
+            if backend == "simdjson":
+                raise
+    if loads is None:
+        loads = json.loads
+
+    if cache_size:
+        loads = functools.lru_cache(maxsize=cache_size)(loads)
+    return loads
+
+
+def load_json_nan(df, json_col, json_backend="auto", json_cache=None):
     """Load a JSON file even if there are NaNs.
 
     Args:
         df (pd.DataFrame): The DataFrame containing the JSON column to be loaded.
         json_col (str): The JSON column to be loaded.
+        json_backend (str, optional): JSON backend passed to json_decoder. Defaults to 'auto'.
+        json_cache (int, optional): Number of decoded strings to memoize, passed to json_decoder. Defaults to None; no cache.
 
     Returns:
         df (pd.Series): A pd.Series of a JSON column
     """
-    return df[json_col].apply(lambda x: json.loads(x) if type(x) == str else x)
+    loads = json_decoder(json_backend, json_cache)
+    values = [loads(x) if isinstance(x, str) else x for x in df[json_col].to_numpy()]
+    return pd.Series(values, index=df.index, name=json_col, dtype=object)
 
 
 def unpack_json(
@@ -77,6 +172,11 @@ def unpack_json(
     index_name=None,
     key_col_name=None,
     value_col_name=None,
+    engine="columnar",
+    n_jobs=1,
+    json_backend="auto",
+    json_cache=None,
+    compact=False,
 ):
     """Unpack a JSON column from a SafeGraph Patterns dataset.
 
@@ -86,21 +186,215 @@ def unpack_json(
         index_name (str, optional): Index name for new ExtendedDataFrame. Defaults to None.
         key_col_name (str, optional): Key name for new ExtendedDataFrame. Defaults to None.
         value_col_name (str, optional): Value name for new ExtendedDataFrame. Defaults to None.
+        engine (str, optional): Unpacking engine, either 'columnar' (flat key/value/parent arrays) or 'python' (row by row). Defaults to 'columnar'.
+        n_jobs (int, optional): Number of worker processes the rows are partitioned across; -1 uses all cores. Results keep the row order of df. Defaults to 1.
+        json_backend (str, optional): JSON backend passed to json_decoder. Defaults to 'auto'.
+        json_cache (int, optional): Number of decoded strings to memoize, passed to json_decoder. Defaults to None; no cache.
+        compact (bool|str, optional): Encode the keys as a pandas Categorical (True or 'category') or as packed integers ('uint64', for numeric GEOIDs; restore them with .astype(str).str.zfill(12)) and the values as the smallest integer dtype that fits. Defaults to False.
+
+    Raises:
+        ValueError: If the index of df is not unique or the engine or compact mode is not recognized.
 
     Returns:
         pd.DataFrame: DataFrame of an unpacked JSON column.
     """
-    import numpy as np
-
-    # these checks are inefficent for multithreading, but it's not a big deal
     if key_col_name is None:
         key_col_name = json_column + "_key"
     if value_col_name is None:
         value_col_name = json_column + "_value"
     if df.index.unique().shape[0] < df.shape[0]:
-        raise ("ERROR -- non-unique index found")
+        raise ValueError("ERROR -- non-unique index found")
+
+    if engine == "columnar":
+        unpack = _unpack_json_columnar
+    elif engine == "python":
+        unpack = _unpack_json_python
+    else:
+        raise ValueError("The engine must be either 'columnar' or 'python'.")
+
+    # Fail early on an unknown or missing backend rather than inside the workers
+    json_decoder(json_backend, json_cache)
+    decoding = (json_backend, json_cache)
+    if compact not in (False, True, "category", "uint64"):
+        raise ValueError("The compact mode must be one of False, True, 'category' or 'uint64'.")
+
+    n_jobs = _resolve_n_jobs(n_jobs)
+    if n_jobs == 1 or df.shape[0] < 2:
+        unpacked = unpack(df, json_column, index_name, key_col_name, value_col_name, decoding)
+    else:
+        unpacked = _unpack_json_parallel(
+            unpack, df, json_column, index_name, key_col_name, value_col_name, decoding, n_jobs
+        )
+
+    if compact:
+        # Applied after reassembly so that all partitions share one set of categories
+        keys = "uint64" if compact == "uint64" else "category"
+        unpacked[key_col_name] = _compact_keys(unpacked[key_col_name], keys=keys)
+        unpacked[value_col_name] = _downcast_integers(unpacked[value_col_name])
+    return unpacked
+
+
+def _unpack_json_parallel(
+    unpack, df, json_column, index_name, key_col_name, value_col_name, decoding, n_jobs, executor=None
+):
+    """Unpack row partitions of df in worker processes and reassemble them in row order.
+
+    The workers of executor are used if one is given, e.g. one pool shared by the chunks of a file; otherwise a pool is started for df.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            return _unpack_json_parallel(
+                unpack, df, json_column, index_name, key_col_name, value_col_name, decoding, n_jobs, executor
+            )
+
+    # Only ship the columns the workers need
+    columns = [json_column] if index_name is None else [json_column, index_name]
+    parts = _partition_rows(df[columns], n_jobs)
+    n_parts = len(parts)
+    # map() yields results in submission order, so the output is deterministic
+    results = list(
+        executor.map(
+            unpack,
+            parts,
+            [json_column] * n_parts,
+            [index_name] * n_parts,
+            [key_col_name] * n_parts,
+            [value_col_name] * n_parts,
+            [decoding] * n_parts,
+        )
+    )
+    results = [result for result in results if result.shape[0] > 0]
+    if len(results) == 0:
+        return unpack(df.iloc[:0], json_column, index_name, key_col_name, value_col_name, decoding)
+    return pd.concat(results)
+
+
+def _compact_keys(values, keys="category"):
+    """Encode key strings such as CBG GEOIDs as a Categorical or as packed unsigned integers."""
+    if keys == "uint64":
+        try:
+            return pd.to_numeric(values, errors="raise").astype("uint64")
+        except (ValueError, TypeError):
+            raise ValueError("Only numeric keys such as CBG GEOIDs can be packed as uint64.")
+    return values.astype("category")
+
+
+def _downcast_integers(values):
+    """Downcast an integer Series to the smallest integer dtype that holds its values."""
+    if not pd.api.types.is_integer_dtype(values):
+        return values
+    if values.shape[0] > 0 and values.min() >= 0:
+        return pd.to_numeric(values, downcast="unsigned")
+    return pd.to_numeric(values, downcast="integer")
+
+
+def compact_dtypes(df, category_threshold=0.5, verbose=True):
+    """Shrink a DataFrame by downcasting integer columns and encoding repeated string columns as Categoricals.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to be compacted.
+        category_threshold (float, optional): String columns whose share of unique values is at most this are encoded as Categoricals. Defaults to 0.5.
+        verbose (bool, optional): A flag indicating whether the memory saved should be printed. Defaults to True.
+
+    Returns:
+        tuple: The compacted DataFrame and the number of bytes saved.
+    """
+    before = df.memory_usage(deep=True).sum()
+    df = df.copy()
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_integer_dtype(values):
+            df[col] = _downcast_integers(values)
+        elif pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values):
+            n_values = values.count()
+            if n_values > 0 and values.nunique() / n_values <= category_threshold:
+                df[col] = values.astype("category")
+    after = df.memory_usage(deep=True).sum()
+
+    if verbose:
+        print(
+            "Memory usage reduced from {:.2f} MB to {:.2f} MB ({:.1%} saved)".format(
+                before / 1e6, after / 1e6, 1 - after / before if before else 0
+            )
+        )
+    return df, int(before - after)
+
+
+def _resolve_n_jobs(n_jobs):
+    """Resolve an n_jobs argument into a positive number of worker processes."""
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    if n_jobs == 0:
+        raise ValueError("n_jobs must be a non-zero integer.")
+    return n_jobs
+
+
+def _partition_rows(df, n_parts):
+    """Split a DataFrame into at most n_parts contiguous row partitions."""
+    import numpy as np
+
+    bounds = np.linspace(0, df.shape[0], min(n_parts, df.shape[0]) + 1).astype(int)
+    return [df.iloc[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def _explode_json(values, loads=json.loads):
+    """Parse JSON strings into flat key, value and parent-row-index arrays.
+
+    Args:
+        values (np.array): Raw values of a JSON column; empty strings and nulls are skipped.
+        loads (function, optional): Function decoding a JSON string, e.g. from json_decoder. Defaults to json.loads.
+
+    Returns:
+        tuple: Lists of keys and values, and a np.array of the position of the parent row of each pair.
+    """
+    import numpy as np
+
+    keys = []
+    vals = []
+    counts = np.zeros(len(values), dtype=np.int64)
+    for i, x in enumerate(values):
+        if isinstance(x, str):
+            if x == "":
+                continue
+            x = loads(x)
+        elif not isinstance(x, dict):
+            continue
+        keys.extend(x.keys())
+        vals.extend(x.values())
+        counts[i] = len(x)
+    parents = np.repeat(np.arange(len(values)), counts)
+    return keys, vals, parents
+
+
+def _unpack_json_columnar(
+    df, json_column, index_name, key_col_name, value_col_name, decoding=("auto", None)
+):
+    """Unpack a JSON column by building the long-format DataFrame from flat arrays in one step."""
+    keys, vals, parents = _explode_json(
+        df[json_column].to_numpy(), loads=json_decoder(*decoding)
+    )
+
+    columns = {}
+    if index_name is not None:
+        columns[index_name] = df[index_name].to_numpy().take(parents)
+    columns[key_col_name] = keys
+    columns[value_col_name] = vals
+
+    index = df.index.take(parents)
+    index.name = "orig_index"
+    return pd.DataFrame(columns, index=index)
+
+
+def _unpack_json_python(
+    df, json_column, index_name, key_col_name, value_col_name, decoding=("auto", None)
+):
+    """Unpack a JSON column row by row, building one record per key/value pair."""
     df = df.copy()
-    df[json_column + "_dict"] = load_json_nan(df, json_column)
+    df[json_column + "_dict"] = load_json_nan(df, json_column, *decoding)
     all_sgpid_cbg_data = []  # each cbg data point will be one element in this list
     if index_name is None:
         for index, row in df.iterrows():
@@ -111,7 +405,7 @@ def unpack_json(
                     {"orig_index": index, key_col_name: key, value_col_name: value}
                     for key, value in row[json_column + "_dict"].items()
                 ]
-                all_sgpid_cbg_data = all_sgpid_cbg_data + this_sgpid_cbg_data
+                all_sgpid_cbg_data.extend(this_sgpid_cbg_data)
     else:
         for index, row in df.iterrows():
             if row[json_column] == "" or pd.isnull(row[json_column]):
@@ -127,9 +421,13 @@ def unpack_json(
                     }
                     for key, value in row[json_column + "_dict"].items()
                 ]
-                all_sgpid_cbg_data = all_sgpid_cbg_data + this_sgpid_cbg_data
+                all_sgpid_cbg_data.extend(this_sgpid_cbg_data)
 
-    all_sgpid_cbg_data = pd.DataFrame(all_sgpid_cbg_data)
+    # Name the columns so that rows without pairs still give an empty frame indexed by orig_index
+    columns = ["orig_index", key_col_name, value_col_name]
+    if index_name is not None:
+        columns.insert(1, index_name)
+    all_sgpid_cbg_data = pd.DataFrame(all_sgpid_cbg_data, columns=columns)
     all_sgpid_cbg_data.set_index("orig_index", inplace=True)
     return all_sgpid_cbg_data
 
@@ -140,32 +438,894 @@ def unpack_json_and_merge(
     key_col_name="visitor_home_cbg",
     value_col_name="cbg_visitor_name",
     keep_index=False,
+    engine="columnar",
+    n_jobs=1,
+    json_backend="auto",
+    json_cache=None,
+    compact=False,
+    lazy=False,
 ):
     """Unpack a JSON column from a SafeGraph Patterns dataset.
 
     Args:
-        df (pd.DataFrame): DataFrame containing the JSON column to be unpacked
+        df (pd.DataFrame): DataFrame containing the JSON column to be unpacked; it is not modified.
         json_column (str, optional): JSON column to be unpacked. Defaults to 'visitor_home_cbgs'.
         key_col_name (str, optional): Key name for new ExtendedDataFrame. Defaults to 'visitor_home_cbg'.
         value_col_name (str, optional): Value name for new ExtendedDataFrame. Defaults to 'cbg_visitor_name'.
         keep_index (bool, optional): Keep or do not keep the original index. Defaults to False.
+        engine (str, optional): Unpacking engine passed to unpack_json, either 'columnar' or 'python'. Defaults to 'columnar'.
+        n_jobs (int, optional): Number of worker processes passed to unpack_json; -1 uses all cores. Defaults to 1.
+        json_backend (str, optional): JSON backend passed to json_decoder. Defaults to 'auto'.
+        json_cache (int, optional): Number of decoded strings to memoize, passed to json_decoder. Defaults to None; no cache.
+        compact (bool|str, optional): Compact encoding of the unpacked keys and values passed to unpack_json; True or 'category', or 'uint64'. Defaults to False.
+        lazy (bool, optional): A flag indicating whether to return an UnpackedJoin of the key/value pairs and their row positions in df instead of copying the columns of df onto every pair. Defaults to False.
 
     Returns:
-        pd.DataFrame: DataFrame containing the original DataFrame and the unpacked JSON column as additional columns.
+        pd.DataFrame|UnpackedJoin: DataFrame containing the original DataFrame and the unpacked JSON column as additional columns, or an UnpackedJoin if lazy is True.
     """
+    if lazy:
+        # Unpack a positionally indexed view of the JSON column only, so df is neither copied nor checked for a unique index
+        positional = df[[json_column]].set_axis(pd.RangeIndex(df.shape[0]), axis=0)
+        df_exp = unpack_json(
+            positional,
+            json_column=json_column,
+            key_col_name=key_col_name,
+            value_col_name=value_col_name,
+            engine=engine,
+            n_jobs=n_jobs,
+            json_backend=json_backend,
+            json_cache=json_cache,
+            compact=compact,
+        )
+        return UnpackedJoin(
+            df,
+            df_exp.reset_index(drop=True),
+            df_exp.index.to_numpy(),
+            keep_index=keep_index,
+        )
+
     if keep_index:
-        df["index_original"] = df.index
-    df.reset_index(drop=True, inplace=True)  # Every row must have a unique index
+        df = df.assign(index_original=df.index)
+    df = df.reset_index(drop=True)  # Every row must have a unique index
     df_exp = unpack_json(
         df,
         json_column=json_column,
         key_col_name=key_col_name,
         value_col_name=value_col_name,
+        engine=engine,
+        n_jobs=n_jobs,
+        json_backend=json_backend,
+        json_cache=json_cache,
+        compact=compact,
     )
     df = df.merge(df_exp, left_index=True, right_index=True).reset_index(drop=True)
     return df
 
 
+class UnpackedJoin:
+    """The unpacked key/value pairs of a JSON column with integer row positions into the DataFrame they came from, so the columns of the DataFrame are only joined onto the pairs on request.
+
+    Args:
+        frame (pd.DataFrame): The DataFrame the JSON column was unpacked from.
+        pairs (pd.DataFrame): The unpacked key/value pairs with a RangeIndex.
+        rows (np.array): The row position in frame of each pair.
+        keep_index (bool, optional): A flag indicating whether merge() adds the index of frame as an 'index_original' column. Defaults to False.
+    """
+
+    def __init__(self, frame, pairs, rows, keep_index=False):
+        self.frame = frame
+        self.pairs = pairs
+        self.rows = rows
+        self.keep_index = keep_index
+
+    def __len__(self):
+        return self.pairs.shape[0]
+
+    def column(self, name):
+        """Get one column of the frame aligned with the pairs.
+
+        Args:
+            name (str): The column of the frame.
+
+        Returns:
+            np.array: The values of the column for each pair.
+        """
+        return self.frame[name].to_numpy().take(self.rows)
+
+    def merge(self, columns=None):
+        """Join the columns of the frame onto the pairs.
+
+        Args:
+            columns (list, optional): Columns of the frame to join. Defaults to None; all columns, as returned by unpack_json_and_merge.
+
+        Returns:
+            pd.DataFrame: DataFrame of the joined columns followed by the unpacked key/value columns.
+        """
+        frame = self.frame if columns is None else self.frame[columns]
+        wide = frame.iloc[self.rows].reset_index(drop=True)
+        if self.keep_index:
+            wide["index_original"] = self.frame.index.take(self.rows)
+        return pd.concat([wide, self.pairs], axis=1)
+
+
+def unpack_json_chunked(
+    in_csv,
+    out_csv=None,
+    json_column="visitor_home_cbgs",
+    index_name=None,
+    key_col_name=None,
+    value_col_name=None,
+    usecols=None,
+    chunksize=100000,
+    merge=False,
+    n_jobs=1,
+    json_backend="auto",
+    json_cache=None,
+):
+    """Unpack a JSON column from a SafeGraph Patterns CSV (or gzipped CSV) chunk by chunk, so peak memory is set by the chunk size rather than the file size.
+
+    Args:
+        in_csv (str): File path to the Patterns CSV; compression is inferred from the extension (e.g. .csv.gz).
+        out_csv (str, optional): File path of a CSV (or .csv.gz) sink the unpacked chunks are appended to. Defaults to None; returns a generator of chunks instead.
+        json_column (str, optional): JSON column to be unpacked. Defaults to 'visitor_home_cbgs'.
+        index_name (str, optional): Column carried onto each unpacked row, e.g. 'placekey'. Defaults to None.
+        key_col_name (str, optional): Key name for the unpacked DataFrame. Defaults to None.
+        value_col_name (str, optional): Value name for the unpacked DataFrame. Defaults to None.
+        usecols (list, optional): Additional columns to read; these are merged onto the unpacked rows if merge is True. Defaults to None.
+        chunksize (int, optional): Number of CSV rows read per chunk. Defaults to 100000.
+        merge (bool, optional): A flag indicating whether each chunk's columns should be merged onto its unpacked rows, as in unpack_json_and_merge. Defaults to False.
+        n_jobs (int, optional): Number of worker processes each chunk is unpacked with, started once for the whole file; -1 uses all cores. Defaults to 1.
+        json_backend (str, optional): JSON backend passed to json_decoder. Defaults to 'auto'.
+        json_cache (int, optional): Number of decoded strings to memoize across chunks, passed to json_decoder. Defaults to None; no cache.
+
+    Raises:
+        FileNotFoundError: If the provided file path does not exist.
+
+    Returns:
+        generator|str: A generator of unpacked pd.DataFrame chunks indexed by the row position in in_csv, or the file path of out_csv.
+    """
+    in_csv = os.path.abspath(in_csv)
+
+    if not os.path.exists(in_csv):
+        raise FileNotFoundError("The provided csv could not be found.")
+
+    chunks = _iter_unpacked_chunks(
+        in_csv,
+        json_column=json_column,
+        index_name=index_name,
+        key_col_name=key_col_name,
+        value_col_name=value_col_name,
+        usecols=usecols,
+        chunksize=chunksize,
+        merge=merge,
+        n_jobs=n_jobs,
+        json_backend=json_backend,
+        json_cache=json_cache,
+    )
+
+    if out_csv is None:
+        return chunks
+
+    return _write_csv_chunks(chunks, out_csv, index=not merge)
+
+
+def _write_csv_chunks(chunks, out_csv, index=True):
+    """Append DataFrame chunks to a CSV (or .csv.gz) file, writing the header once."""
+    import gzip
+
+    out_csv = os.path.abspath(out_csv)
+    out_dir = os.path.dirname(out_csv)
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    if out_csv.endswith(".gz"):
+        f = gzip.open(out_csv, "wt", newline="")
+    else:
+        f = open(out_csv, "w", newline="")
+    with f:
+        header = True
+        for chunk in chunks:
+            chunk.to_csv(f, header=header, index=index)
+            header = False
+
+    return out_csv
+
+
+def _iter_unpacked_chunks(
+    in_csv,
+    json_column,
+    index_name,
+    key_col_name,
+    value_col_name,
+    usecols,
+    chunksize,
+    merge,
+    n_jobs,
+    json_backend,
+    json_cache,
+):
+    """Read a Patterns CSV in row chunks and yield each chunk's unpacked JSON column."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    if key_col_name is None:
+        key_col_name = json_column + "_key"
+    if value_col_name is None:
+        value_col_name = json_column + "_value"
+    json_decoder(json_backend, json_cache)
+    decoding = (json_backend, json_cache)
+    n_jobs = _resolve_n_jobs(n_jobs)
+
+    columns = [json_column]
+    if index_name is not None and index_name not in columns:
+        columns.append(index_name)
+    if usecols is not None:
+        columns = columns + [col for col in usecols if col not in columns]
+
+    reader = pd.read_csv(
+        in_csv, usecols=columns, dtype={json_column: str}, chunksize=chunksize
+    )
+    # One pool serves every chunk, rather than a pool started and torn down per chunk
+    executor = ProcessPoolExecutor(max_workers=n_jobs) if n_jobs > 1 else None
+    try:
+        for chunk in reader:
+            if executor is None or chunk.shape[0] < 2:
+                unpacked = _unpack_json_columnar(
+                    chunk, json_column, index_name, key_col_name, value_col_name, decoding
+                )
+            else:
+                unpacked = _unpack_json_parallel(
+                    _unpack_json_columnar,
+                    chunk,
+                    json_column,
+                    index_name,
+                    key_col_name,
+                    value_col_name,
+                    decoding,
+                    n_jobs,
+                    executor,
+                )
+            if merge:
+                if index_name is not None:
+                    unpacked = unpacked.drop(columns=index_name)
+                unpacked = chunk.merge(
+                    unpacked, left_index=True, right_index=True
+                ).reset_index(drop=True)
+            yield unpacked
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def json_array(df, json_column="visits_by_day", dtype="int32", fill_value=0, json_backend="auto"):
+    """Parse an array- or dict-valued SafeGraph JSON column (e.g. visits_by_day, popularity_by_hour, popularity_by_day, bucketed_dwell_times) into a dense 2-D array in one bulk decode.
+
+    Args:
+        df (pd.DataFrame): DataFrame containing the JSON column to be parsed.
+        json_column (str, optional): JSON column to be parsed. Defaults to 'visits_by_day'.
+        dtype (str, optional): dtype of the output array. Defaults to 'int32'.
+        fill_value (int, optional): Value used for rows with a missing JSON value, to pad rows shorter than the longest one and for keys missing from a dict-valued row. Defaults to 0.
+        json_backend (str, optional): JSON backend passed to json_decoder. Defaults to 'auto'.
+
+    Returns:
+        tuple: A C-contiguous np.array of shape (n_rows, width) whose rows follow the row order of df, and the list of dict keys naming its columns, the union of the keys of all rows (None for array-valued columns).
+    """
+    import itertools
+    import operator
+    import numpy as np
+
+    raw = df[json_column].to_numpy()
+    valid = np.fromiter(
+        (isinstance(x, str) and x != "" for x in raw), dtype=bool, count=len(raw)
+    )
+
+    # Decode every row with a single call by joining them into one JSON array
+    parsed = json_decoder(json_backend)("[" + ",".join(raw[valid]) + "]")
+
+    labels = None
+    if len(parsed) > 0 and isinstance(parsed[0], dict):
+        keys = parsed[0].keys()
+        if not all(row.keys() == keys for row in parsed):
+            # Rows with different keys are spread over the union of keys, in order of first appearance
+            labels = list(dict.fromkeys(itertools.chain.from_iterable(parsed)))
+            parsed = [[row.get(label, fill_value) for label in labels] for row in parsed]
+        elif len(keys) == 1:
+            labels = list(keys)
+            parsed = [[row[labels[0]]] for row in parsed]
+        else:
+            labels = list(keys)
+            parsed = list(map(operator.itemgetter(*labels), parsed))
+
+    lengths = np.fromiter(map(len, parsed), dtype=np.int64, count=len(parsed))
+    width = int(lengths.max()) if len(parsed) > 0 else 0
+    flat = np.fromiter(
+        itertools.chain.from_iterable(parsed), dtype=dtype, count=int(lengths.sum())
+    )
+
+    block = np.full((len(parsed), width), fill_value, dtype=dtype)
+    block[np.arange(width) < lengths[:, None]] = flat
+
+    values = np.full((len(raw), width), fill_value, dtype=dtype)
+    values[valid] = block
+    return values, labels
+
+
+def visitor_matrix(
+    data,
+    json_column="visitor_home_cbgs",
+    index_name="placekey",
+    dtype="int64",
+    chunksize=None,
+    out_npz=None,
+    json_backend="auto",
+    json_cache=None,
+):
+    """Build a sparse POI by home CBG origin-destination matrix straight from a SafeGraph JSON column.
+
+    Args:
+        data (str|pd.DataFrame|list): A Patterns DataFrame, the file path to a Patterns CSV, or a list of either (e.g. several months) whose matrices are summed.
+        json_column (str, optional): JSON column holding the visitor counts. Defaults to 'visitor_home_cbgs'.
+        index_name (str, optional): Column identifying each POI; rows sharing a value are summed. Defaults to 'placekey'.
+        dtype (str, optional): dtype of the matrix values. Defaults to 'int64'.
+        chunksize (int, optional): Number of CSV rows read at a time from file paths. Defaults to None; reads each file at once.
+        out_npz (str, optional): The file path for the output .npz, readable by load_visitor_matrix or scipy.sparse.load_npz. Defaults to None; doesn't save.
+        json_backend (str, optional): JSON backend passed to json_decoder. Defaults to 'auto'.
+        json_cache (int, optional): Number of decoded strings to memoize, passed to json_decoder. Defaults to None; no cache.
+
+    Raises:
+        FileNotFoundError: If a provided file path does not exist.
+        TypeError: If data is not a str, pd.DataFrame or a list of them.
+
+    Returns:
+        tuple: A scipy.sparse.csr_matrix of visitor counts, a pd.Index of the POI labels of its rows and a pd.Index of the CBG GEOIDs of its columns.
+    """
+    if isinstance(data, (str, pd.DataFrame)):
+        data = [data]
+
+    loads = json_decoder(json_backend, json_cache)
+    parts = []
+    for item in data:
+        if isinstance(item, str):
+            if not os.path.exists(item):
+                raise FileNotFoundError("The provided csv could not be found.")
+            frames = pd.read_csv(
+                item,
+                usecols=[index_name, json_column],
+                dtype={index_name: str, json_column: str},
+                chunksize=chunksize,
+            )
+            if chunksize is None:
+                frames = [frames]
+        elif isinstance(item, pd.DataFrame):
+            frames = [item]
+        else:
+            raise TypeError("The data must be a type of str, pandas.DataFrame, or a list of them.")
+
+        for frame in frames:
+            parts.append(_visitor_triplets(frame, json_column, index_name, dtype, loads))
+
+    matrix, rows, cols = _build_labelled_matrix(parts, index_name, json_column, dtype)
+
+    if out_npz is not None:
+        save_visitor_matrix(out_npz, matrix, rows, cols)
+
+    return matrix, rows, cols
+
+
+def _visitor_triplets(df, json_column, index_name, dtype, loads):
+    """The row and column labels of a single Patterns DataFrame and the COO triplets of its visitor counts."""
+    import numpy as np
+
+    row_codes, rows = pd.factorize(df[index_name])
+    keys, vals, parents = _explode_json(df[json_column].to_numpy(), loads=loads)
+    col_codes, cols = pd.factorize(pd.Index(keys), sort=True)
+
+    pair_rows = row_codes[parents]
+    valid = pair_rows >= 0  # drop pairs of rows missing a POI label
+    return rows, cols, pair_rows[valid], col_codes[valid], np.asarray(vals, dtype=dtype)[valid]
+
+
+def _build_labelled_matrix(parts, index_name, json_column, dtype):
+    """Sum the triplets of every part into one CSR matrix over the union of their labels.
+
+    Rows keep the order in which POIs first appear and columns are sorted. The labels and codes of all parts are gathered first, so the matrix is built once rather than once per part.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    rows = pd.Index(np.concatenate([part[0] for part in parts]) if parts else [], name=index_name).unique()
+    cols = pd.Index(np.concatenate([part[1] for part in parts]) if parts else [], name=json_column).unique().sort_values()
+    row_codes = [rows.get_indexer(part_rows)[codes] for part_rows, _, codes, _, _ in parts]
+    col_codes = [cols.get_indexer(part_cols)[codes] for _, part_cols, _, codes, _ in parts]
+    vals = [part[4] for part in parts]
+
+    matrix = sparse.csr_matrix(
+        (
+            np.concatenate(vals) if parts else np.zeros(0, dtype=dtype),
+            (
+                np.concatenate(row_codes) if parts else np.zeros(0, dtype=np.intp),
+                np.concatenate(col_codes) if parts else np.zeros(0, dtype=np.intp),
+            ),
+        ),
+        shape=(len(rows), len(cols)),
+        dtype=dtype,
+    )
+    matrix.sum_duplicates()
+    return matrix, rows, cols
+
+
+def _reindex_sparse(matrix, rows, cols, new_rows, new_cols):
+    """Move the entries of a labelled sparse matrix onto new labels, summing repeated labels and dropping entries whose labels are missing."""
+    from scipy import sparse
+
+    coo = matrix.tocoo()
+    row_map = new_rows.get_indexer(rows)[coo.row]
+    col_map = new_cols.get_indexer(cols)[coo.col]
+    keep = (row_map >= 0) & (col_map >= 0)
+    return sparse.csr_matrix(
+        (coo.data[keep], (row_map[keep], col_map[keep])),
+        shape=(len(new_rows), len(new_cols)),
+    )
+
+
+def save_visitor_matrix(out_npz, matrix, rows, cols):
+    """Save a labelled sparse visitor matrix to a compressed .npz.
+
+    The file keeps the layout of scipy.sparse.save_npz, so scipy.sparse.load_npz can read the matrix alone.
+
+    Args:
+        out_npz (str): The file path for the output .npz.
+        matrix (scipy.sparse.csr_matrix): The visitor matrix.
+        rows (pd.Index): The labels of the matrix rows.
+        cols (pd.Index): The labels of the matrix columns.
+    """
+    import numpy as np
+
+    out_npz = os.path.abspath(out_npz)
+    out_dir = os.path.dirname(out_npz)
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    matrix = matrix.tocsr()
+    np.savez_compressed(
+        out_npz,
+        format=np.array(b"csr"),
+        shape=np.array(matrix.shape),
+        data=matrix.data,
+        indices=matrix.indices,
+        indptr=matrix.indptr,
+        row_labels=np.asarray(rows, dtype=str),
+        col_labels=np.asarray(cols, dtype=str),
+        row_name=np.array(str(rows.name)),
+        col_name=np.array(str(cols.name)),
+    )
+
+
+def load_visitor_matrix(in_npz):
+    """Load a labelled sparse visitor matrix saved by visitor_matrix or save_visitor_matrix.
+
+    Args:
+        in_npz (str): The file path to the input .npz.
+
+    Raises:
+        FileNotFoundError: If the provided file path does not exist.
+
+    Returns:
+        tuple: A scipy.sparse.csr_matrix of visitor counts, a pd.Index of its row labels and a pd.Index of its column labels.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    if not os.path.exists(in_npz):
+        raise FileNotFoundError("The provided npz could not be found.")
+
+    with np.load(in_npz) as loaded:
+        matrix = sparse.csr_matrix(
+            (loaded["data"], loaded["indices"], loaded["indptr"]),
+            shape=tuple(loaded["shape"]),
+        )
+        rows = pd.Index(loaded["row_labels"].astype(object), name=str(loaded["row_name"]))
+        cols = pd.Index(loaded["col_labels"].astype(object), name=str(loaded["col_name"]))
+    return matrix, rows, cols
+
+
+_ADDRESS_ABBREVIATIONS = {
+    "street": "st",
+    "avenue": "ave",
+    "road": "rd",
+    "drive": "dr",
+    "highway": "hwy",
+    "boulevard": "blvd",
+    "lane": "ln",
+    "court": "ct",
+    "parkway": "pkwy",
+    "pike": "pk",
+    "suite": "ste",
+    "north": "n",
+    "south": "s",
+    "east": "e",
+    "west": "w",
+}
+
+
+def normalize_text(series):
+    """Normalize free text such as customer_FullAddress so that trivially different spellings match.
+
+    Text is case-folded, punctuation is replaced by spaces, common street words are abbreviated (e.g. 'Street' to 'st') and whitespace is collapsed.
+
+    Args:
+        series (pd.Series): The text to be normalized.
+
+    Returns:
+        pd.Series: The normalized text; nulls are kept.
+    """
+    import re
+
+    words = re.compile(r"\b(" + "|".join(_ADDRESS_ABBREVIATIONS) + r")\b")
+    text = series.astype(str).str.casefold()
+    text = text.str.replace(r"[^\w\s]", " ", regex=True)
+    text = text.str.replace(words, lambda m: _ADDRESS_ABBREVIATIONS[m.group(1)], regex=True)
+    text = text.str.replace(r"\s+", " ", regex=True).str.strip()
+    return text.where(series.notnull())
+
+
+def row_fingerprints(df, columns=None, normalize=None):
+    """Hash the chosen columns of every row into a fixed-width 64-bit fingerprint.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to be hashed.
+        columns (list, optional): Columns identifying a record. Defaults to None; all columns.
+        normalize (list, optional): Text columns passed through normalize_text before hashing, e.g. ['customer_FullAddress']. Defaults to None.
+
+    Numeric columns are hashed as float64, so a key read as int64 from one file and as float64 from another (e.g. because of a missing value) has the same fingerprint.
+
+    Returns:
+        np.array: A uint64 fingerprint per row.
+    """
+    keys = df if columns is None else df[columns]
+    numeric = [
+        col for col, dtype in keys.dtypes.items()
+        if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+    ]
+    keys = keys.astype({col: "float64" for col in numeric})
+    if normalize is not None:
+        keys = keys.assign(**{col: normalize_text(keys[col]) for col in normalize})
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+
+def deduplicate_hashed(
+    data,
+    columns=None,
+    keep="first",
+    order_by=None,
+    normalize=None,
+    chunksize=None,
+    out_csv=None,
+    verbose=True,
+):
+    """Drop duplicate records across DataFrames, CSV files or their chunks using 64-bit row fingerprints.
+
+    A first pass hashes the key columns of every row; only the fingerprints, the order_by ranks and the row positions are held in memory. A second pass streams the inputs again and keeps the chosen row of each fingerprint.
+
+    Args:
+        data (str|pd.DataFrame|list): A DataFrame, the file path to a CSV, or a list of either (e.g. several months of Patterns).
+        columns (list, optional): Columns identifying a record. Defaults to None; all columns.
+        keep (str, optional): Keep the 'first' or 'last' record of each key; with order_by, the one with the smallest or largest order_by value. Ties and missing values follow the input order. Defaults to 'first'.
+        order_by (str, optional): Column ranking the duplicates, e.g. 'date_range_end'. Defaults to None; the input order.
+        normalize (list, optional): Text columns normalized before hashing, e.g. ['customer_FullAddress']. Defaults to None.
+        chunksize (int, optional): Number of CSV rows read at a time from file paths. Defaults to None; reads each file at once.
+        out_csv (str, optional): File path of a CSV (or .csv.gz) the kept rows are written to. Defaults to None; returns them as a DataFrame.
+        verbose (bool, optional): A flag indicating whether the number of dropped records should be printed. Defaults to True.
+
+    Raises:
+        ValueError: If keep is not 'first' or 'last'.
+
+    Returns:
+        tuple: The de-duplicated pd.DataFrame (or the file path of out_csv), and a pd.DataFrame of the key columns of every key that had duplicates with the number of records dropped for it ('n_dropped').
+    """
+    import numpy as np
+
+    if keep not in ("first", "last"):
+        raise ValueError("keep must be either 'first' or 'last'.")
+    if isinstance(data, (str, pd.DataFrame)):
+        data = [data]
+
+    fingerprints = []
+    orders = []
+    for frame in _iter_frames(data, chunksize):
+        fingerprints.append(row_fingerprints(frame, columns, normalize))
+        if order_by is not None:
+            orders.append(frame[order_by].to_numpy())
+    fingerprints = np.concatenate(fingerprints) if fingerprints else np.zeros(0, "uint64")
+    positions = np.arange(fingerprints.shape[0])
+
+    # Ranking needs at least one row; with none, there is nothing to rank
+    if order_by is not None and fingerprints.shape[0] > 0:
+        ranks, _ = pd.factorize(np.concatenate(orders), sort=True)
+        if keep == "first":
+            # Missing values (-1) rank as the least preferred record
+            ranks[ranks < 0] = ranks.max() + 1
+    else:
+        ranks = np.zeros(fingerprints.shape[0])
+
+    order = np.lexsort((positions, ranks, fingerprints))
+    sorted_fingerprints = fingerprints[order]
+    # No rows, e.g. an empty month file, give no groups rather than one empty group
+    starts = np.flatnonzero(np.r_[sorted_fingerprints.shape[0] > 0, sorted_fingerprints[1:] != sorted_fingerprints[:-1]])
+    sizes = np.diff(np.r_[starts, sorted_fingerprints.shape[0]])
+    if keep == "first":
+        winners = order[starts]
+    else:
+        winners = order[starts + sizes - 1]
+
+    kept = np.zeros(fingerprints.shape[0], dtype=bool)
+    kept[winners] = True
+    dropped = np.zeros(fingerprints.shape[0], dtype=np.int64)
+    dropped[winners] = sizes - 1
+
+    reports = []
+
+    def kept_chunks():
+        offset = 0
+        for frame in _iter_frames(data, chunksize):
+            stop = offset + frame.shape[0]
+            chunk = frame[kept[offset:stop]]
+            chunk_dropped = dropped[offset:stop][kept[offset:stop]]
+            if (chunk_dropped > 0).any():
+                key_columns = list(frame.columns) if columns is None else columns
+                report = chunk.loc[chunk_dropped > 0, key_columns].copy()
+                report["n_dropped"] = chunk_dropped[chunk_dropped > 0]
+                reports.append(report)
+            offset = stop
+            yield chunk
+
+    if out_csv is None:
+        chunks = list(kept_chunks())
+        result = pd.concat(chunks) if chunks else pd.DataFrame(columns=columns)
+    else:
+        result = _write_csv_chunks(kept_chunks(), out_csv, index=False)
+
+    if reports:
+        report = pd.concat(reports, ignore_index=True)
+    else:
+        report = pd.DataFrame(columns=(columns or []) + ["n_dropped"])
+    if verbose:
+        print("Dropped {} duplicate records of {} keys".format(int(dropped.sum()), report.shape[0]))
+    return result, report
+
+
+def _iter_frames(data, chunksize=None):
+    """Iterate over DataFrames and the (chunked) contents of CSV file paths."""
+    for item in data:
+        if isinstance(item, str):
+            if not os.path.exists(item):
+                raise FileNotFoundError("The provided csv could not be found.")
+            if chunksize is None:
+                yield pd.read_csv(item)
+            else:
+                for chunk in pd.read_csv(item, chunksize=chunksize):
+                    yield chunk
+        elif isinstance(item, pd.DataFrame):
+            yield item
+        else:
+            raise TypeError("The data must be a type of str, pandas.DataFrame, or a list of them.")
+
+
+class PatternsPanel:
+    """A persistent, month-partitioned Parquet store of SafeGraph Patterns files and their unpacked visitor CBGs.
+
+    The store keeps a POI table and an unpacked CBG table side by side, each partitioned on disk by date_range_start, and a manifest of the ingested source files so that only new or changed files are read again.
+
+    Args:
+        root (str): The directory of the store; created if it does not exist.
+        json_column (str, optional): JSON column unpacked into the CBG table. Defaults to 'visitor_home_cbgs'.
+        index_name (str, optional): Column identifying each POI. Defaults to 'placekey'.
+        key_col_name (str, optional): Key name of the CBG table. Defaults to 'visitor_home_cbg'.
+        value_col_name (str, optional): Value name of the CBG table. Defaults to 'cbg_visitor_name'.
+    """
+
+    _id_columns = ["placekey", "poi_cbg", "postal_code", "naics_code", "phone_number"]
+
+    def __init__(
+        self,
+        root,
+        json_column="visitor_home_cbgs",
+        index_name="placekey",
+        key_col_name="visitor_home_cbg",
+        value_col_name="cbg_visitor_name",
+    ):
+        self.root = os.path.abspath(root)
+        self.json_column = json_column
+        self.index_name = index_name
+        self.key_col_name = key_col_name
+        self.value_col_name = value_col_name
+        if not os.path.exists(self.root):
+            os.makedirs(self.root)
+        self.manifest = self._read_manifest()
+
+    def ingest(self, in_csvs, deduplicate=None, force=False):
+        """Ingest Patterns CSVs (or gzipped CSVs), skipping files that are unchanged since they were last ingested.
+
+        Args:
+            in_csvs (str|list): File path(s) to the Patterns CSVs, e.g. the parts of one or more monthly drops.
+            deduplicate (list, optional): Columns for which to drop duplicate records within each file before writing. Defaults to None.
+            force (bool, optional): A flag indicating whether unchanged files should be ingested again. Defaults to False.
+
+        Raises:
+            FileNotFoundError: If a provided file path does not exist.
+
+        Returns:
+            list: The months (date_range_start dates) that were written.
+        """
+        if isinstance(in_csvs, str):
+            in_csvs = [in_csvs]
+
+        written = set()
+        for in_csv in in_csvs:
+            in_csv = os.path.abspath(in_csv)
+            if not os.path.exists(in_csv):
+                raise FileNotFoundError("The provided csv could not be found.")
+
+            fingerprint = self._fingerprint(in_csv)
+            entry = self.manifest.get(in_csv)
+            if not force and entry is not None and entry["fingerprint"] == fingerprint:
+                continue
+
+            # Drop the parts this file wrote before, in case its months changed
+            if entry is not None:
+                self._remove_parts(entry["part"], entry["months"])
+
+            df = pd.read_csv(in_csv, dtype={col: str for col in self._id_columns})
+            if deduplicate is not None:
+                df = df.drop_duplicates(subset=deduplicate)
+            df = df[df["date_range_start"].notnull()].reset_index(drop=True)
+            months = df["date_range_start"].astype(str).str[:10]
+
+            part = _file_id(in_csv)
+            for month, pois in df.groupby(months.to_numpy(), sort=True):
+                self._write_month(month, part, pois)
+                written.add(month)
+
+            self.manifest[in_csv] = {
+                "fingerprint": fingerprint,
+                "part": part,
+                "months": sorted(months.unique().tolist()),
+            }
+            self._write_manifest()
+
+        return sorted(written)
+
+    def months(self):
+        """List the months held by the store.
+
+        Returns:
+            list: Sorted date_range_start dates (YYYY-MM-DD) of the stored partitions.
+        """
+        months = set()
+        for entry in self.manifest.values():
+            months.update(entry["months"])
+        return sorted(months)
+
+    def read_pois(self, start=None, end=None, placekeys=None, columns=None):
+        """Read the POI table, loading only the requested months, POIs and columns.
+
+        Args:
+            start (str, optional): First month to read, e.g. '2020-03' or '2020-03-01'. Defaults to None; from the first month.
+            end (str, optional): Last month to read (inclusive). Defaults to None; to the last month.
+            placekeys (list, optional): POIs to read. Defaults to None; all POIs.
+            columns (list, optional): Columns to read. Defaults to None; all columns.
+
+        Returns:
+            pd.DataFrame: The matching rows of the POI table.
+        """
+        filters = None
+        if placekeys is not None:
+            filters = [(self.index_name, "in", list(placekeys))]
+        return self._read("pois", start, end, filters, columns)
+
+    def read_cbgs(self, start=None, end=None, placekeys=None, cbgs=None, columns=None):
+        """Read the unpacked CBG table, loading only the requested months, POIs, CBGs and columns.
+
+        Args:
+            start (str, optional): First month to read, e.g. '2020-03' or '2020-03-01'. Defaults to None; from the first month.
+            end (str, optional): Last month to read (inclusive). Defaults to None; to the last month.
+            placekeys (list, optional): POIs to read. Defaults to None; all POIs.
+            cbgs (list, optional): Home CBG GEOIDs to read. Defaults to None; all CBGs.
+            columns (list, optional): Columns to read. Defaults to None; all columns.
+
+        Returns:
+            pd.DataFrame: The matching rows of the CBG table, with a date_range_start column.
+        """
+        filters = []
+        if placekeys is not None:
+            filters.append((self.index_name, "in", list(placekeys)))
+        if cbgs is not None:
+            filters.append((self.key_col_name, "in", [str(cbg) for cbg in cbgs]))
+        return self._read("cbgs", start, end, filters or None, columns)
+
+    def _write_month(self, month, part, pois):
+        """Write one source file's POIs of one month and their unpacked CBGs."""
+        pois = pois.sort_values(self.index_name, kind="stable").reset_index(drop=True)
+        cbgs = unpack_json(
+            pois,
+            json_column=self.json_column,
+            index_name=self.index_name,
+            key_col_name=self.key_col_name,
+            value_col_name=self.value_col_name,
+        ).reset_index(drop=True)
+        cbgs.insert(0, "date_range_start", month)
+
+        for table, df in (("pois", pois), ("cbgs", cbgs)):
+            # Columns with no values in this part are written as nulls, which take the type of the other parts when read
+            empty = df.columns[df.isna().all().to_numpy()]
+            df = df.astype({col: object for col in empty})
+            out_dir = self._month_dir(table, month)
+            if not os.path.exists(out_dir):
+                os.makedirs(out_dir)
+            df.to_parquet(os.path.join(out_dir, part + ".parquet"), index=False)
+
+    def _read(self, table, start, end, filters, columns):
+        """Read the Parquet parts of a table whose months fall in [start, end]."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        tables = []
+        for month in self.months():
+            if start is not None and month[: len(start)] < start:
+                continue
+            if end is not None and month[: len(end)] > end:
+                continue
+            month_dir = self._month_dir(table, month)
+            if not os.path.exists(month_dir):
+                continue
+            for name in sorted(os.listdir(month_dir)):
+                tables.append(
+                    pq.read_table(
+                        os.path.join(month_dir, name), columns=columns, filters=filters
+                    )
+                )
+
+        if len(tables) == 0:
+            return pd.DataFrame(columns=columns)
+        # Each part keeps the types inferred from its own rows, e.g. int64 for a count column that is double in a month with missing values
+        return pa.concat_tables(tables, promote_options="permissive").to_pandas()
+
+    def _remove_parts(self, part, months):
+        """Delete the Parquet parts a source file wrote for the given months."""
+        for table in ("pois", "cbgs"):
+            for month in months:
+                path = os.path.join(self._month_dir(table, month), part + ".parquet")
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _month_dir(self, table, month):
+        return os.path.join(self.root, table, "date_range_start=" + month)
+
+    def _read_manifest(self):
+        path = os.path.join(self.root, "manifest.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_manifest(self):
+        with open(os.path.join(self.root, "manifest.json"), "w") as f:
+            f.write(json.dumps(self.manifest, indent=2))
+
+    @staticmethod
+    def _fingerprint(path):
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+
+def _file_id(path):
+    """Build a short, stable identifier for a source file path."""
+    import hashlib
+
+    name = os.path.basename(path).split(".")[0]
+    digest = hashlib.sha1(path.encode("utf-8")).hexdigest()[:10]
+    return name + "-" + digest
+
+
 def unique_sorted_values_plus_ALL(array):
     """Obtain a sorted array of all unique values in an array, including an additional value of 'ALL' to denote all values.
 
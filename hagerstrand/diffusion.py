@@ -0,0 +1,208 @@
+"""A module for Hägerstrand-style Monte Carlo simulation of spatial innovation diffusion over areal units such as census block groups."""
+
+import numpy as np
+import pandas as pd
+from .spatial import distance_matrix
+
+
+def mean_information_field(distances, kernel="power", beta=2.0, radius=None, min_distance=None, weights=None):
+    """Build the mean information field (MIF), the probability that a message sent from each unit reaches each other unit, from a distance decay kernel.
+
+    Args:
+        distances (np.array): Array of shape (n, n) of distances between the units.
+        kernel (str, optional): The distance decay kernel; 'power' (d ** -beta), 'exponential' (exp(-beta * d)) or 'gaussian' (exp(-0.5 * (d / beta) ** 2)). Defaults to 'power'.
+        beta (float, optional): The decay parameter of the kernel; the bandwidth for 'gaussian'. Defaults to 2.0.
+        radius (float, optional): Units farther than this distance are never contacted, as at the edge of Hägerstrand's grid. Defaults to None; no limit.
+        min_distance (float, optional): The distance used for contacts within a unit, which the power kernel cannot evaluate at 0. Defaults to None; half the distance to the nearest other unit.
+        weights (np.array, optional): The weight of each destination unit, e.g. its population, so a message is more likely to reach a populous unit. Defaults to None; equal weights.
+
+    Raises:
+        ValueError: If the kernel is not recognized or the distances are not square.
+
+    Returns:
+        np.array: Array of shape (n, n) whose rows sum to 1; rows with no reachable unit send every message to themselves.
+    """
+    distances = np.array(distances, dtype=np.float64)
+    n = distances.shape[0]
+    if distances.ndim != 2 or distances.shape[1] != n:
+        raise ValueError("The distances must be a square matrix.")
+
+    if min_distance is None:
+        positive = np.where(distances > 0, distances, np.inf).min(axis=1)
+        min_distance = np.where(np.isfinite(positive), positive / 2, 1.0)[:, None]
+    distances = np.where(distances > 0, distances, min_distance)
+
+    if kernel == "power":
+        field = distances ** -beta
+    elif kernel == "exponential":
+        field = np.exp(-beta * distances)
+    elif kernel == "gaussian":
+        field = np.exp(-0.5 * (distances / beta) ** 2)
+    else:
+        raise ValueError("The kernel must be 'power', 'exponential' or 'gaussian'.")
+
+    if radius is not None:
+        field[distances > radius] = 0
+    if weights is not None:
+        field *= np.asarray(weights, dtype=np.float64)[None, :]
+
+    totals = field.sum(axis=1)
+    empty = totals == 0
+    field[empty, np.flatnonzero(empty)] = 1
+    totals[empty] = 1
+    return field / totals[:, None]
+
+
+class DiffusionModel:
+    """A Hägerstrand innovation diffusion model over areal units, e.g. the CBGs of a county.
+
+    In every generation each adopter sends messages to units drawn from the mean information field, and each non-adopter that receives a message adopts with a given probability. All agents of a generation are simulated at once with array operations.
+
+    Args:
+        gdf (gpd.GeoDataFrame): The units, as points (e.g. from poly_centroid) or polygons, whose centroids are used.
+        population (str|np.array): The column, or array, of the number of agents in each unit.
+        adopters (str|np.array, optional): The column, or array, of the initial number of adopters in each unit. Defaults to None; no adopters.
+        metric (str, optional): The measure of distance between units, as in spatial.distance_matrix. Defaults to 'haversine' (miles).
+        kernel (str, optional): The distance decay kernel of the mean information field. Defaults to 'power'.
+        beta (float, optional): The decay parameter of the kernel. Defaults to 2.0.
+        radius (float, optional): The largest distance a message can travel. Defaults to None; no limit.
+        min_distance (float, optional): The distance used for contacts within a unit. Defaults to None; half the distance to the nearest other unit.
+        contacts (int, optional): Number of messages each adopter sends per generation. Defaults to 1.
+        adoption_prob (float, optional): The probability that a non-adopter adopts on receiving a message. Defaults to 1.0.
+        weight_by_population (bool, optional): Whether messages are more likely to reach populous units. Defaults to True.
+
+    Raises:
+        ValueError: If there are more initial adopters than agents in a unit.
+    """
+
+    def __init__(
+        self,
+        gdf,
+        population,
+        adopters=None,
+        metric="haversine",
+        kernel="power",
+        beta=2.0,
+        radius=None,
+        min_distance=None,
+        contacts=1,
+        adoption_prob=1.0,
+        weight_by_population=True,
+    ):
+        self.units = gdf.index
+        self.population = self._column(gdf, population)
+        if adopters is None:
+            self.adopters = np.zeros_like(self.population)
+        else:
+            self.adopters = self._column(gdf, adopters)
+        if (self.adopters > self.population).any():
+            raise ValueError("There cannot be more initial adopters than agents in a unit.")
+
+        points = gdf
+        if not (gdf.geom_type == "Point").all():
+            points = gdf.set_geometry(gdf.geometry.centroid)
+        distances = distance_matrix(points, points, metric=metric, dtype="float64")
+        weights = self.population if weight_by_population else None
+        self.mif = mean_information_field(distances, kernel, beta, radius, min_distance, weights)
+        self.contacts = contacts
+        self.adoption_prob = adoption_prob
+
+        # Rows of the cumulative MIF offset by their position, so the targets of all messages are drawn with one search
+        n = len(self.units)
+        cdf = np.cumsum(self.mif, axis=1)
+        self._flat_cdf = (cdf + np.arange(n)[:, None]).ravel()
+        self._first_target = np.argmax(self.mif > 0, axis=1)
+        self._last_target = n - 1 - np.argmax(self.mif[:, ::-1] > 0, axis=1)
+
+    def __len__(self):
+        return len(self.units)
+
+    @staticmethod
+    def _column(gdf, values):
+        if isinstance(values, str):
+            values = gdf[values]
+        return np.asarray(values).astype(np.int64)
+
+    def step(self, adopters, rng):
+        """Simulate one generation.
+
+        Args:
+            adopters (np.array): The number of adopters in each unit.
+            rng (np.random.Generator): The random number generator.
+
+        Returns:
+            np.array: The number of adopters in each unit after the generation.
+        """
+        n = len(self)
+        senders = np.repeat(np.arange(n), adopters * self.contacts)
+        if len(senders) == 0:
+            return adopters.copy()
+
+        positions = np.searchsorted(self._flat_cdf, senders + rng.random(len(senders)), side="right")
+        targets = np.clip(positions - senders * n, self._first_target[senders], self._last_target[senders])
+        received = np.bincount(targets, minlength=n)
+
+        # Each non-adopter independently receives at least one adopting message
+        non_adopters = self.population - adopters
+        share = np.divide(self.adoption_prob, self.population, out=np.zeros(n), where=self.population > 0)
+        prob = -np.expm1(received * np.log1p(-np.minimum(share, 1)))
+        return adopters + rng.binomial(non_adopters, prob)
+
+    def run(self, generations, seed=None):
+        """Simulate one run of the diffusion.
+
+        Args:
+            generations (int): Number of generations.
+            seed (int|np.random.SeedSequence, optional): The seed of the run. Defaults to None; unseeded.
+
+        Returns:
+            pd.DataFrame: The cumulative number of adopters of each unit (columns) by generation (rows), starting with the initial adopters.
+        """
+        return pd.DataFrame(self._run(generations, seed), columns=self.units).rename_axis("generation")
+
+    def _run(self, generations, seed):
+        rng = np.random.default_rng(seed)
+        history = np.empty((generations + 1, len(self)), dtype=np.int64)
+        history[0] = self.adopters
+        for generation in range(generations):
+            history[generation + 1] = self.step(history[generation], rng)
+        return history
+
+    def replicate(self, n_runs, generations, seed=None, n_jobs=1):
+        """Simulate independent runs of the diffusion, optionally across worker processes.
+
+        Each run is seeded from its own child of one np.random.SeedSequence, so the results depend on the seed but not on n_jobs.
+
+        Args:
+            n_runs (int): Number of runs.
+            generations (int): Number of generations of each run.
+            seed (int, optional): The seed of the runs. Defaults to None; unseeded.
+            n_jobs (int, optional): Number of worker processes; -1 uses all processors. Defaults to 1.
+
+        Returns:
+            np.array: Array of shape (n_runs, generations + 1, n) of the cumulative number of adopters by run, generation and unit.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        from .dataprocess import _resolve_n_jobs
+
+        seeds = np.random.SeedSequence(seed).spawn(n_runs)
+        n_jobs = min(_resolve_n_jobs(n_jobs), n_runs)
+        if n_jobs == 1:
+            return np.stack([self._run(generations, child) for child in seeds])
+
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_run_worker, initargs=(self,)) as executor:
+            runs = executor.map(_run_worker, seeds, [generations] * n_runs)
+            return np.stack(list(runs))
+
+
+_WORKER_MODEL = [None]
+
+
+def _init_run_worker(model):
+    """Keep the model once in a worker process."""
+    _WORKER_MODEL[0] = model
+
+
+def _run_worker(seed, generations):
+    """Simulate one run with the model of the worker process."""
+    return _WORKER_MODEL[0]._run(generations, seed)
@@ -1,5 +1,6 @@
 """Main module for the hagerstrand package."""
 import os
+import functools
 import ipyleaflet
 import ee
 import box
@@ -13,6 +14,7 @@ import geopandas as gpd
 import json
 from .utils import random_string
 from .common import ee_initialize, tool_template
+from .spatial import SpatialIndex, get_spatial_index, point_coords, parallel_query, EARTH_RADIUS_MILES
 from .toolbar import main_toolbar, filter_df_widget
 
 
@@ -191,8 +193,9 @@ class Map(ipyleaflet.Map):
             style (dict, optional): The style for the JSON. Defaults to None.
             layer_name (str, optional): The layer name for the JSON layer. Defaults to "Untitled".
         """
-        geojson = gmapjson_to_geojson(in_json)
-        self.add_geojson(geojson, style=style, layer_name=layer_name)
+        gdf = gmapjson_to_gdf(in_json, activity=False)
+        gdf["timestamp"] = gdf["timestamp"].dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+        self.add_geojson(gdf.__geo_interface__, style=style, layer_name=layer_name)
 
     def add_gdf(self, in_gdf, style=None, layer_name="Untitled"):
         """Adds a Pandas DataFrame to the map
@@ -416,12 +419,14 @@ class Map(ipyleaflet.Map):
             tool.value = False
 
 # Credit: Dr. Qiusheng Wu
-def shp_to_geojson(in_shp, out_geojson=None):
+def shp_to_geojson(in_shp, out_geojson=None, columns=None, filters=None):
     """Converts a shapefile to GeoJSON.
 
     Args:
-        in_shp (str): The file path to the input shapefile.
-        out_geojson (str, optional): The file path for the output GeoJSON. Defaults to None.
+        in_shp (str): The file path to the input shapefile, or to a GeoParquet (.parquet) or Feather (.feather, .arrow) file.
+        out_geojson (str, optional): The file path for the output GeoJSON, or a GeoParquet (.parquet) or Feather (.feather, .arrow) file. Defaults to None.
+        columns (list, optional): The attribute columns to read. Defaults to None; reads all columns.
+        filters (list, optional): Row filters of a GeoParquet or Feather input, as in read_geo. Defaults to None.
 
     Raises:
         FileNotFoundError: If the provided file path does not exist.
@@ -434,8 +439,22 @@ def shp_to_geojson(in_shp, out_geojson=None):
     if not os.path.exists(in_shp):
         raise FileNotFoundError("The provided shapefile could not be found.")
 
-    sf = shapefile.Reader(in_shp)
-    geojson = sf.__geo_interface__
+    if _is_columnar(in_shp):
+        gdf = read_geo(in_shp, columns=columns, filters=filters)
+    elif columns is not None or _is_columnar(out_geojson):
+        gdf = gpd.read_file(in_shp, columns=columns)
+    else:
+        gdf = None
+
+    if _is_columnar(out_geojson):
+        write_geo(gdf, out_geojson)
+        return
+
+    if gdf is None:
+        sf = shapefile.Reader(in_shp)
+        geojson = sf.__geo_interface__
+    else:
+        geojson = gdf.__geo_interface__
 
     if out_geojson is None:
         return geojson
@@ -448,14 +467,16 @@ def shp_to_geojson(in_shp, out_geojson=None):
             f.write(json.dumps(geojson))    
 
 
-def csv_to_geojson(in_csv, out_geojson=None, x="longitude", y="latitude"):
+def csv_to_geojson(in_csv, out_geojson=None, x="longitude", y="latitude", columns=None, filters=None):
     """Convert a comma separated values file to a GeoJSON.
 
     Args:
-        in_csv ([type]): Input file path of the CSV.
-        out_geojson ([type], optional): Output file path of the GeoJSON. Defaults to None.
+        in_csv ([type]): Input file path of the CSV, or of a Parquet (.parquet) or Feather (.feather, .arrow) table.
+        out_geojson ([type], optional): Output file path of the GeoJSON, or of a GeoParquet (.parquet) or Feather (.feather, .arrow) file. Defaults to None.
         x (str, optional): Column name for the x coordinate. Defaults to "longitude".
         y (str, optional): Column name for the y coordinate. Defaults to "latitude".
+        columns (list, optional): The columns to read; the coordinate columns are always read. Defaults to None; reads all columns.
+        filters (list, optional): Row filters of a Parquet or Feather input, as in read_geo. Defaults to None.
 
     Raises:
         FileNotFoundError: If the provided input file path does not exist.
@@ -469,13 +490,17 @@ def csv_to_geojson(in_csv, out_geojson=None, x="longitude", y="latitude"):
     if not os.path.exists(in_csv):
         raise FileNotFoundError("The provided csv could not be founded.")
 
-    df = pd.read_csv(in_csv)
+    df = _read_table(in_csv, columns=columns, filters=filters, required=[x, y])
     gdf = gpd.GeoDataFrame(
         df,
-        crs = {'init':'epsg:4326'},
+        crs = "EPSG:4326",
         geometry = gpd.points_from_xy(x=df[x], y=df[y])
     )
 
+    if _is_columnar(out_geojson):
+        write_geo(gdf, out_geojson)
+        return
+
     geojson = gdf.__geo_interface__
 
     if out_geojson is None:
@@ -489,93 +514,320 @@ def csv_to_geojson(in_csv, out_geojson=None, x="longitude", y="latitude"):
             f.write(json.dumps(geojson))       
 
 
-def csv_to_shp(in_csv, out_shp, x="longitude", y="latitude"):#, in_crs=4326, out_crs=4326):
+def csv_to_shp(in_csv, out_shp, x="longitude", y="latitude", columns=None, filters=None):#, in_crs=4326, out_crs=4326):
     """Convert a comma separated values file to an ESRI Shapefile.
 
     Args:
-        in_csv (str): Input file path of the CSV.
-        out_shp (str): Output file path of the shapefile.
+        in_csv (str): Input file path of the CSV, or of a Parquet (.parquet) or Feather (.feather, .arrow) table.
+        out_shp (str): Output file path of the shapefile, or of a GeoParquet (.parquet) or Feather (.feather, .arrow) file.
         x (str, optional): Column name for the x coordinate. Defaults to "longitude".
         y (str, optional): Column name for the y coordinate. Defaults to "latitude".
+        columns (list, optional): The columns to read; the coordinate columns are always read. Defaults to None; reads all columns.
+        filters (list, optional): Row filters of a Parquet or Feather input, as in read_geo. Defaults to None.
 
     Raises:
         FileNotFoundError: If the provided input file path does not exist.
-        ValueError: If the provided output file path does not end in .shp.
+        ValueError: If the provided output file path does not end in .shp, .parquet, .feather or .arrow.
     """
     # TO-DO: Add CRS flag and input/output
-    import csv
-
     in_csv = os.path.abspath(in_csv)
 
     if not os.path.exists(in_csv):
         raise FileNotFoundError("The provided csv could not be founded.")
 
-    if out_shp[-3:] != "shp":
-        raise ValueError("The outpath filepath is not specified as a .shp file.")
+    if out_shp[-3:] != "shp" and not _is_columnar(out_shp):
+        raise ValueError("The outpath filepath is not specified as a .shp, .parquet, .feather or .arrow file.")
 
-    df = pd.read_csv(in_csv)
+    df = _read_table(in_csv, columns=columns, filters=filters, required=[x, y])
     gdf = gpd.GeoDataFrame(
         df,
-        crs = {'init':'epsg:4326'},
+        crs = "EPSG:4326",
         geometry = gpd.points_from_xy(x=df[x], y=df[y])
     )
 
-    gdf.to_file(out_shp)
+    if _is_columnar(out_shp):
+        write_geo(gdf, out_shp)
+    else:
+        gdf.to_file(out_shp)
 
 
 
-def gmapjson_to_geojson(in_gmapjson, out_gmapgeojson=None):
+def gmapjson_to_geojson(in_gmapjson, out_gmapgeojson=None, batch_size=100000):
     """Converts a Google Map Location History JSON to GeoJSON.
 
+    When an output file is given, the locations are streamed to it in batches, so memory does not grow with the size of the Takeout export.
+
     Args:
         in_gmapjson (str): The file path to the input JSON.
-        out_gmapgeojson (str, optional): The file path for the output GeoJSON. Defaults to None.
+        out_gmapgeojson (str, optional): The file path for the output GeoJSON, or a GeoParquet (.parquet) or Feather (.feather, .arrow) file as written by gmapjson_to_file. Defaults to None.
+        batch_size (int, optional): Number of locations converted at a time. Defaults to 100000.
 
     Raises:
         FileNotFoundError: If the provided file path does not exist.
     """
+    if out_gmapgeojson is not None:
+        gmapjson_to_file(in_gmapjson, out_gmapgeojson, batch_size=batch_size)
+        return
+
+    features = []
+    for batch in iter_gmapjson(in_gmapjson, batch_size=batch_size):
+        features.extend(_gmap_features(batch))
+    return {"type": "FeatureCollection", "features": features}
+
+
+def iter_gmapjson(in_gmapjson, batch_size=100000, buffer_size=1048576):
+    """Reads the locations of a Google Map Location History JSON one at a time, yielding them in batches.
+
+    Only one batch and one read buffer are held in memory, whatever the size of the file.
+
+    Args:
+        in_gmapjson (str): The file path to the input JSON.
+        batch_size (int, optional): Number of locations per batch. Defaults to 100000.
+        buffer_size (int, optional): Number of characters read from the file at a time. Defaults to 1048576.
+
+    Raises:
+        FileNotFoundError: If the provided file path does not exist.
+        ValueError: If the file has no locations array or ends in the middle of it.
+
+    Returns:
+        generator: Lists of up to batch_size location dicts, as in the file.
+    """
+    import re
 
-    import json
-    import datetime
-    
     in_gmapjson = os.path.abspath(in_gmapjson)
 
     if not os.path.exists(in_gmapjson):
        raise FileNotFoundError("The provided json could not be found.")
 
-    with open(in_gmapjson) as f:
-        data = json.load(f)
-    
-    for item in data["locations"]:
-        item["latitudeE7"] = item["latitudeE7"] * 0.0000001
-        item["longitudeE7"] = item["longitudeE7"] * 0.0000001
-        item["timestampMs"] = datetime.datetime.fromtimestamp(int(item["timestampMs"])/1000.0)
-        item["timestampMs"] = item["timestampMs"].strftime('%Y-%m-%d %H:%M:%S') 
-    
-    data_intermediate = data["locations"]
+    decoder = json.JSONDecoder()
+    array_start = re.compile(r'"locations"\s*:\s*\[')
+    whitespace = re.compile(r'[\s,]*')
+
+    with open(in_gmapjson, encoding="utf-8") as f:
+        buffer = ""
+        while True:
+            chunk = f.read(buffer_size)
+            buffer += chunk
+            match = array_start.search(buffer)
+            if match is not None:
+                break
+            if not chunk:
+                raise ValueError("The provided json has no locations array.")
+            # Keep enough of the buffer for a key split across reads
+            buffer = buffer[-64:]
+
+        pos = match.end()
+        batch = []
+        eof = False
+        while True:
+            pos = whitespace.match(buffer, pos).end()
+            if pos < len(buffer) and buffer[pos] == "]":
+                break
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise ValueError("The provided json ends inside the locations array.")
+                chunk = f.read(buffer_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            if end == len(buffer) and not eof:
+                # A number at the end of the buffer may continue in the next read
+                chunk = f.read(buffer_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            batch.append(item)
+            pos = end
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def gmapjson_to_file(in_gmapjson, out_file, batch_size=100000):
+    """Streams a Google Map Location History JSON to a GeoJSON, GeoParquet, Feather or CSV file, one batch of locations at a time.
+
+    GeoJSON features keep the properties written by gmapjson_to_geojson. GeoParquet, Feather and CSV files get one row per location, with latitude, longitude, a UTC timestamp and the accuracy, velocity, heading, altitude and verticalAccuracy fields; GeoParquet and Feather files also get a WKB point geometry in EPSG:4326 and can be read back with read_geo.
 
-    geojson = {
-        "type": "FeatureCollection",
-        "features": [
-        {
-            "type": "Feature",
-            "geometry" : {
-                "type": "Point",
-                "coordinates": [d["longitudeE7"], d["latitudeE7"]],
-                },
-            "properties" : d,
-        } for d in data_intermediate]
-    }
+    Args:
+        in_gmapjson (str): The file path to the input JSON.
+        out_file (str): The file path for the output; its extension (.geojson, .json, .parquet, .feather, .arrow or .csv) sets the format.
+        batch_size (int, optional): Number of locations converted and written at a time; each batch is one Parquet row group. Defaults to 100000.
+
+    Raises:
+        FileNotFoundError: If the provided file path does not exist.
+        ValueError: If the output extension is not supported.
+    """
+    out_file = os.path.abspath(out_file)
+    extension = os.path.splitext(out_file)[1].lower()
+    if extension not in (".geojson", ".json", ".csv") and not _is_columnar(out_file):
+        raise ValueError("The output file must be a .geojson, .json, .parquet, .feather, .arrow or .csv file.")
+
+    batches = iter_gmapjson(in_gmapjson, batch_size=batch_size)
+    out_dir = os.path.dirname(out_file)
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    if _is_columnar(out_file):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        def to_table(records):
+            frame = _gmap_frame(records)
+            geometry = gpd.points_from_xy(frame["longitude"].to_numpy(), frame["latitude"].to_numpy())
+            return _geo_table(gpd.GeoDataFrame(frame, geometry=geometry, crs="EPSG:4326"))
+
+        writer = None
+        try:
+            for batch in batches:
+                table = to_table(batch)
+                if writer is None:
+                    if _is_parquet(out_file):
+                        writer = pq.ParquetWriter(out_file, table.schema)
+                    else:
+                        writer = pa.ipc.new_file(out_file, table.schema)
+                writer.write_table(table)
+            if writer is None:
+                table = to_table([])
+                if _is_parquet(out_file):
+                    writer = pq.ParquetWriter(out_file, table.schema)
+                else:
+                    writer = pa.ipc.new_file(out_file, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    elif extension == ".csv":
+        from .dataprocess import _write_csv_chunks
+
+        frames = (_gmap_frame(batch) for batch in batches)
+        _write_csv_chunks(frames, out_file, index=False)
 
-    if out_gmapgeojson is None:
-        return geojson
     else:
-        out_gmapgeojson = os.path.abspath(out_gmapgeojson)
-        out_dir = os.path.dirname(out_gmapgeojson)
-        if not os.path.exists(out_dir):
-            os.makedirs(out_dir)
-        with open(out_gmapgeojson, "w") as f:
-            f.write(json.dumps(geojson)) 
+        with open(out_file, "w") as f:
+            f.write('{"type": "FeatureCollection", "features": [')
+            separator = ""
+            for batch in batches:
+                for feature in _gmap_features(batch):
+                    f.write(separator + json.dumps(feature))
+                    separator = ", "
+            f.write("]}")
+
+
+_GMAP_FIELDS = ["accuracy", "velocity", "heading", "altitude", "verticalAccuracy"]
+
+
+def _gmap_frame(records, activity=False):
+    """Convert a batch of Location History records to columns, scaling coordinates and timestamps in one step each."""
+    frame = pd.DataFrame.from_records(
+        records, columns=["timestampMs", "timestamp", "latitudeE7", "longitudeE7"] + _GMAP_FIELDS
+    )
+    timestamp = pd.Series(pd.to_datetime(pd.to_numeric(frame["timestampMs"]), unit="ms", utc=True))
+    missing = timestamp.isna().to_numpy()
+    if missing.any():
+        # Newer exports give an ISO 8601 timestamp instead of timestampMs
+        timestamp[missing] = pd.to_datetime(frame["timestamp"][missing], utc=True, format="ISO8601")
+
+    columns = pd.DataFrame({
+        "timestamp": timestamp,
+        "latitude": frame["latitudeE7"].to_numpy(dtype=np.float64) * 1e-7,
+        "longitude": frame["longitudeE7"].to_numpy(dtype=np.float64) * 1e-7,
+        **{field: frame[field].astype("float64") for field in _GMAP_FIELDS},
+    })
+    if activity:
+        columns["activity"], columns["activity_confidence"] = _gmap_activity(records)
+    return columns
+
+
+def _gmap_activity(records):
+    """The most confident activity type of the first activity reading of each record, and its confidence."""
+    types = [None] * len(records)
+    confidences = np.full(len(records), np.nan)
+    for i, record in enumerate(records):
+        readings = record.get("activity")
+        if readings and readings[0].get("activity"):
+            best = max(readings[0]["activity"], key=lambda guess: guess.get("confidence", 0))
+            types[i] = best.get("type")
+            confidences[i] = best.get("confidence", np.nan)
+    return pd.Categorical(types), confidences
+
+
+def gmapjson_to_gdf(in_gmapjson, start=None, end=None, activity=True, batch_size=100000):
+    """Reads a Google Map Location History JSON into a GeoDataFrame of points, one row per location.
+
+    Coordinates are scaled from E7 and timestamps converted to UTC datetime64 a batch at a time, and the points are built in one vectorized call, so the result can be filtered by time without parsing strings.
+
+    Args:
+        in_gmapjson (str): The file path to the input JSON.
+        start (str|pd.Timestamp, optional): Only locations at or after this time are kept; naive times are taken as UTC. Defaults to None.
+        end (str|pd.Timestamp, optional): Only locations before this time are kept; naive times are taken as UTC. Defaults to None.
+        activity (bool, optional): Whether to add the most confident recorded activity type ('activity', categorical) and its confidence ('activity_confidence'). Defaults to True.
+        batch_size (int, optional): Number of locations converted at a time. Defaults to 100000.
+
+    Raises:
+        FileNotFoundError: If the provided file path does not exist.
+
+    Returns:
+        gpd.GeoDataFrame: The locations, with timestamp, latitude, longitude, accuracy, velocity, heading, altitude and verticalAccuracy columns, in EPSG:4326.
+    """
+    start = _utc_timestamp(start)
+    end = _utc_timestamp(end)
+
+    frames = []
+    for batch in iter_gmapjson(in_gmapjson, batch_size=batch_size):
+        frame = _gmap_frame(batch, activity=activity)
+        if start is not None:
+            frame = frame[frame["timestamp"] >= start]
+        if end is not None:
+            frame = frame[frame["timestamp"] < end]
+        frames.append(frame)
+
+    if frames:
+        df = pd.concat(frames, ignore_index=True)
+    else:
+        df = _gmap_frame([], activity=activity)
+    if activity:
+        df["activity"] = df["activity"].astype("category")
+
+    return gpd.GeoDataFrame(
+        df,
+        geometry=gpd.points_from_xy(df["longitude"].to_numpy(), df["latitude"].to_numpy()),
+        crs="EPSG:4326",
+    )
+
+
+def _utc_timestamp(value):
+    """Convert a time bound to a UTC pd.Timestamp, taking naive times as UTC."""
+    if value is None:
+        return None
+    value = pd.Timestamp(value)
+    return value.tz_localize("UTC") if value.tzinfo is None else value.tz_convert("UTC")
+
+
+def _gmap_features(records):
+    """Convert a batch of Location History records to GeoJSON features with the legacy properties."""
+    from dateutil.tz import tzlocal
+
+    ms = np.array([record["timestampMs"] for record in records], dtype=np.int64)
+    times = pd.to_datetime(ms, unit="ms", utc=True).tz_convert(tzlocal()).strftime("%Y-%m-%d %H:%M:%S")
+    lat = (np.array([record["latitudeE7"] for record in records], dtype=np.float64) * 1e-7).tolist()
+    lon = (np.array([record["longitudeE7"] for record in records], dtype=np.float64) * 1e-7).tolist()
+
+    features = []
+    for record, time, y, x in zip(records, times, lat, lon):
+        properties = dict(record, timestampMs=time, latitudeE7=y, longitudeE7=x)
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [x, y]},
+            "properties": properties,
+        })
+    return features
 
 
 def gdf_to_geojson(gdf, out_geojson=None):
@@ -583,7 +835,7 @@ def gdf_to_geojson(gdf, out_geojson=None):
     
     Args:
         gdf (gpd.GeoDataFrame): A GeoPandas GeoDataFrame.
-        out_geojson (str): File path to the output GeoJSON.
+        out_geojson (str): File path to the output GeoJSON, or to a GeoParquet (.parquet) or Feather (.feather, .arrow) file.
 
     Returns:
         GeoJSON: GeoJSON of a converted pandas DataFrame
@@ -592,6 +844,10 @@ def gdf_to_geojson(gdf, out_geojson=None):
  #   if not isinstance(gdf, gpd.GeoDataFrame):
  #       err_str = "\n\nThe gdf argument must be an instance of a gpd.GeoDataFrame"
  #       raise TypeError(err_str)
+
+    if _is_columnar(out_geojson):
+        write_geo(gdf, out_geojson)
+        return
     
     geojson = gdf.__geo_interface__
 
@@ -606,6 +862,169 @@ def gdf_to_geojson(gdf, out_geojson=None):
             f.write(json.dumps(geojson)) 
 
 
+_COLUMNAR_EXTENSIONS = (".parquet", ".geoparquet", ".feather", ".arrow")
+
+
+def _is_columnar(path):
+    """Whether a file path names a Parquet or Feather file."""
+    return isinstance(path, str) and os.path.splitext(path)[1].lower() in _COLUMNAR_EXTENSIONS
+
+
+def _is_parquet(path):
+    """Whether a file path names a Parquet file rather than a Feather file."""
+    return os.path.splitext(path)[1].lower() in (".parquet", ".geoparquet")
+
+
+def write_geo(gdf, out_file, row_group_size=None, compression="snappy"):
+    """Write a geopandas.GeoDataFrame to GeoParquet or Feather, columnar files with WKB geometry that reload much faster than GeoJSON or shapefiles.
+
+    Args:
+        gdf (gpd.GeoDataFrame): A GeoPandas GeoDataFrame.
+        out_file (str): File path to the output; .parquet (or .geoparquet) writes GeoParquet, .feather (or .arrow) writes Feather.
+        row_group_size (int, optional): Number of rows per Parquet row group; smaller groups let filters and bounding boxes on read skip more of the file, using the statistics of the attribute columns and of a bounding box column written with the geometry. Defaults to None; the pyarrow default.
+        compression (str, optional): The compression codec. Defaults to "snappy" for Parquet; Feather uses lz4 where "snappy" is given.
+
+    Raises:
+        ValueError: If the output extension is not supported.
+    """
+    if not _is_columnar(out_file):
+        raise ValueError("The output file must be a .parquet, .geoparquet, .feather or .arrow file.")
+
+    out_file = os.path.abspath(out_file)
+    out_dir = os.path.dirname(out_file)
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    if _is_parquet(out_file):
+        gdf.to_parquet(out_file, compression=compression, row_group_size=row_group_size, write_covering_bbox=True)
+    else:
+        gdf.to_feather(out_file, compression="lz4" if compression == "snappy" else compression)
+
+
+def read_geo(in_file, columns=None, filters=None, bbox=None):
+    """Read a GeoParquet or Feather file, e.g. written by write_geo or gmapjson_to_file, into a geopandas.GeoDataFrame.
+
+    Args:
+        in_file (str): File path to the .parquet (or .geoparquet), .feather or .arrow file.
+        columns (list, optional): The columns to read; the geometry column is always read. Defaults to None; reads all columns.
+        filters (list|pyarrow.compute.Expression, optional): Row filters in pyarrow's format, e.g. [("date_range_start", ">=", "2021-01-01")]. For Parquet, row groups whose statistics rule them out are skipped without being read. Defaults to None.
+        bbox (tuple, optional): The (minx, miny, maxx, maxy) that kept geometries must intersect. Defaults to None.
+
+    Raises:
+        FileNotFoundError: If the provided file path does not exist.
+        ValueError: If the input extension is not supported.
+
+    Returns:
+        gpd.GeoDataFrame: The features.
+    """
+    in_file = os.path.abspath(in_file)
+
+    if not os.path.exists(in_file):
+        raise FileNotFoundError("The provided file could not be found.")
+
+    if not _is_columnar(in_file):
+        raise ValueError("The input file must be a .parquet, .geoparquet, .feather or .arrow file.")
+
+    metadata = _geo_metadata(in_file)
+    geometry = metadata.get("primary_column", "geometry")
+    if columns is not None:
+        columns = list(columns) + ([geometry] if geometry not in columns else [])
+
+    column = metadata.get("columns", {}).get(geometry, {})
+
+    if _is_parquet(in_file):
+        # Row groups are skipped by the statistics of the bounding box column, if the file has one
+        covered = bbox if "covering" in column else None
+        gdf = gpd.read_parquet(in_file, columns=columns, filters=filters, bbox=covered)
+    elif filters is None:
+        gdf = gpd.read_feather(in_file, columns=columns)
+    else:
+        import pyarrow.feather as feather
+        import pyarrow.parquet as pq
+
+        table = feather.read_table(in_file, columns=columns)
+        if isinstance(filters, list):
+            filters = pq.filters_to_expression(filters)
+        df = table.filter(filters).to_pandas()
+        covering = list(column.get("covering", {}).get("bbox", {}).get("xmin", [])[:1])
+        gdf = gpd.GeoDataFrame(
+            df.drop(columns=[col for col in covering if col in df.columns]),
+            geometry=gpd.GeoSeries.from_wkb(df[geometry].to_numpy()).values,
+            crs=column.get("crs", "OGC:CRS84"),
+        )
+
+    if bbox is not None:
+        from shapely.geometry import box
+
+        gdf = gdf[gdf.intersects(box(*bbox))]
+    return gdf
+
+
+def _read_schema(in_file):
+    """The pyarrow.Schema of a Parquet or Feather file, read without its data."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if _is_parquet(in_file):
+        return pq.read_schema(in_file)
+    with pa.memory_map(in_file) as source:
+        return pa.ipc.open_file(source).schema
+
+
+def _geo_metadata(in_file):
+    """The geo metadata of a GeoParquet or Feather file, or an empty dict if it has none."""
+    metadata = (_read_schema(in_file).metadata or {}).get(b"geo")
+    return {} if metadata is None else json.loads(metadata)
+
+
+def _geo_table(gdf):
+    """Convert a geopandas.GeoDataFrame to a pyarrow.Table with WKB geometry, a bounding box column and GeoParquet metadata, for writers that append tables one at a time."""
+    import pyarrow as pa
+
+    name = gdf.geometry.name
+    table = pa.Table.from_pandas(gdf.to_wkb(), preserve_index=False)
+    bounds = gdf.geometry.bounds
+    table = table.append_column("bbox", pa.StructArray.from_arrays(
+        [pa.array(bounds[key].to_numpy()) for key in ("minx", "miny", "maxx", "maxy")],
+        names=["xmin", "ymin", "xmax", "ymax"],
+    ))
+    column = {
+        "encoding": "WKB",
+        "geometry_types": sorted(gdf.geom_type.dropna().unique().tolist()),
+        "covering": {"bbox": {key: ["bbox", key] for key in ("xmin", "ymin", "xmax", "ymax")}},
+    }
+    if gdf.crs is not None:
+        column["crs"] = gdf.crs.to_json_dict()
+    metadata = {"version": "1.0.0", "primary_column": name, "columns": {name: column}}
+    return table.replace_schema_metadata({**(table.schema.metadata or {}), b"geo": json.dumps(metadata).encode()})
+
+
+def _read_table(in_file, columns=None, filters=None, required=()):
+    """Read a CSV, Parquet or Feather table, with optional column projection and, for Parquet and Feather, row filters."""
+    if columns is not None:
+        columns = list(columns) + [col for col in required if col not in columns]
+
+    if not _is_columnar(in_file):
+        return pd.read_csv(in_file, usecols=columns)
+
+    if columns is None:
+        # Leave out the WKB geometry and bounding box columns of GeoParquet and Feather files
+        geo = _geo_metadata(in_file).get("columns", {})
+        skip = set(geo) | {keys["xmin"][0] for meta in geo.values() for keys in meta.get("covering", {}).values()}
+        columns = [name for name in _read_schema(in_file).names if name not in skip] if skip else None
+
+    if _is_parquet(in_file):
+        return pd.read_parquet(in_file, columns=columns, filters=filters)
+
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    table = feather.read_table(in_file, columns=columns)
+    if filters is not None:
+        table = table.filter(pq.filters_to_expression(filters) if isinstance(filters, list) else filters)
+    return table.to_pandas()
+
+
 # def df_to_geojson(df, properties=df.columns.tolist(), vector_geom='Point', coords=["latitude","longitude"], out_geojson=None):
 #     """Convert a pandas.DataFrame or geopandas.GeoDataFrame or hagerstrand.ExtendedDataFrame into a GeoJSON.
 #        Source Inspiration: Geoff Boeing -- https://geoffboeing.com/2015/10/exporting-python-data-geojson/
@@ -762,67 +1181,124 @@ def poly_centroid(in_poly_shp, orig_epsg=6576, change_crs=False, epsg=6576, out_
 
     return points
 
-def csv_to_gdf(in_csv, index_col=None, latloncols=["latitude","longitude"], in_epsg=4326, out_epsg=6576, out_shp=None):
+def csv_to_gdf(in_csv, index_col=None, latloncols=["latitude","longitude"], in_epsg=4326, out_epsg=6576, out_shp=None, usecols=None, dtype=None, chunksize=None):
     """Converts a spreadsheet with latitude and longitude values to a geopandas.GeoDataFrame
 
     Args:
         in_csv (str): The file path to the input csv.
-        index_col (int, optional): The index column. Defaults to None.
+        index_col (int|str, optional): The index column; a position counts among the columns read. Defaults to None.
         latloncols (list, optional): The columns of y and x (e.g. lat, lon) as a list. Defaults to ["latitude","longitude"].
         in_epsg (int, optional): The EPSG code of the csv. Defaults to 4326 (WGS84).
         out_epsg (int, optional): The EPSG code of the output, if desired. Defaults to 6576 (NAD83(2011) State Plane Tennessee).
         out_shp (str, optional): The filepath for the output shapefile. Defaults to None; doesn't save.
+        usecols (list, optional): The columns to read; the coordinate columns are always read. Defaults to None; reads all columns.
+        dtype (dict, optional): dtypes of other columns, passed to pd.read_csv; the coordinate columns are read as float64. Defaults to None.
+        chunksize (int, optional): Number of rows read, transformed and converted at a time, which caps the memory of temporaries for very large files. Defaults to None; reads the file at once.
+
+    Raises:
+        FileNotFoundError: If the provided file path does not exist.
 
     Returns:
         poi (gpd.GeoDataFrame): The output geopandas.GeoDataFrame.
     """
     import pandas as pd
     import geopandas as gpd
-    from shapely.geometry import Point
-    
-    if index_col is not None:
-        poi = pd.read_csv(in_csv, index_col=index_col)
-    else:
-        poi = pd.read_csv(in_csv)
-
-    poi["ycoord"] = poi[latloncols[0]].astype(float)
-    poi["xcoord"] = poi[latloncols[1]].astype(float)
-    epsg_i = "epsg:" + str(in_epsg)
-    poi = gpd.GeoDataFrame(
-        poi,
-        geometry = [Point(x,y) for x, y in zip(poi.xcoord, poi.ycoord)],
-        crs = epsg_i
-    )
-    
+
+    in_csv = os.path.abspath(in_csv)
+
+    if not os.path.exists(in_csv):
+        raise FileNotFoundError("The provided csv could not be found.")
+
+    ycol, xcol = latloncols
+    if usecols is not None:
+        usecols = list(usecols)
+        extra = [ycol, xcol] + ([index_col] if isinstance(index_col, str) else [])
+        usecols += [col for col in extra if col not in usecols]
+    dtypes = dict(dtype or {})
+    dtypes.update({ycol: "float64", xcol: "float64"})
+
+    reader = pd.read_csv(in_csv, index_col=index_col, usecols=usecols, dtype=dtypes, chunksize=chunksize)
+    chunks = [reader] if chunksize is None else reader
     epsg_o = "epsg:" + str(out_epsg)
-    poi = poi.to_crs({"init":epsg_o})
-    
+    transformer = None if in_epsg == out_epsg else get_transformer(in_epsg, out_epsg)
+
+    parts = []
+    for poi in chunks:
+        poi["ycoord"] = poi[ycol].to_numpy()
+        poi["xcoord"] = poi[xcol].to_numpy()
+        x, y = poi["xcoord"].to_numpy(), poi["ycoord"].to_numpy()
+        if transformer is not None:
+            x, y = transformer.transform(x, y)
+        parts.append(gpd.GeoDataFrame(poi, geometry=gpd.points_from_xy(x, y), crs=epsg_o))
+
+    if len(parts) == 1:
+        poi = parts[0]
+    elif parts:
+        poi = gpd.GeoDataFrame(pd.concat(parts), crs=epsg_o)
+    else:
+        poi = gpd.GeoDataFrame(pd.read_csv(in_csv, index_col=index_col, usecols=usecols, dtype=dtypes, nrows=0), geometry=gpd.points_from_xy([], []), crs=epsg_o)
+
     if out_shp is not None:
-        poi.to_file(out_shp)  
+        poi.to_file(out_shp)
 
     return poi
 
-def get_nearest(src_points, candidates, metric='euclidean', k_neighbors=1):
+
+@functools.lru_cache(maxsize=None)
+def get_transformer(in_epsg, out_epsg):
+    """Get a pyproj.Transformer between two EPSG codes, built once per pair and reused.
+
+    Args:
+        in_epsg (int): The EPSG code of the input coordinates.
+        out_epsg (int): The EPSG code of the output coordinates.
+
+    Returns:
+        pyproj.Transformer: A transformer taking and returning (x, y), i.e. (longitude, latitude) for geographic systems.
+    """
+    from pyproj import Transformer
+
+    return Transformer.from_crs("epsg:" + str(in_epsg), "epsg:" + str(out_epsg), always_xy=True)
+
+def _check_index_metric(index, metric):
+    """Raise if a prebuilt SpatialIndex measures distance differently than the metric asked for."""
+    if index.metric != metric:
+        raise ValueError("The spatial index uses the " + index.metric + " metric, not " + metric + ".")
+
+
+def get_nearest(src_points, candidates, metric='euclidean', k_neighbors=1, tree="ball", leaf_size=15, cache=True, all_neighbors=False):
     """Find nearest neighbors for all source points from a set of candidate points
 
     Args:
         src_points (np.array): Numpy array containing x and y coordinates of each source point.
-        candidates (np.array): Numpy array containing x and y coordinates of each potential destination point.
+        candidates (np.array|SpatialIndex): Numpy array containing x and y coordinates of each potential destination point, or a SpatialIndex built from them.
         metric (str, optional): The measure of distance to use to calculate nearest neighbors. Defaults to 'euclidean'.
         k_neighbors (int, optional): Number of nearest neighbors to find. Defaults to 1.
+        tree (str, optional): The tree type, either 'ball' or 'kd'. Defaults to 'ball'.
+        leaf_size (int, optional): The leaf size of the tree. Defaults to 15.
+        cache (bool, optional): A flag indicating whether the tree should be reused from (and kept in) the spatial index cache. Defaults to True.
+        all_neighbors (bool, optional): A flag indicating whether the indices and distances of all k_neighbors should be returned as (n, k) arrays instead of the closest only. Defaults to False.
+
+    Raises:
+        ValueError: If candidates is a SpatialIndex built with another metric.
 
     Returns:
         closest (np.array): Numpy array of indices of closest candidate to each source point.
         closest_dict (np.array): Numpy array of closest distances between source point and closest candidate point.
     """
-    from sklearn.neighbors import BallTree
-    import numpy as np
-
-    # Create tree from the candidate points
-    tree = BallTree(candidates, leaf_size=15, metric=metric)
+    # Reuse or create the tree from the candidate points
+    if isinstance(candidates, SpatialIndex):
+        _check_index_metric(candidates, metric)
+        index = candidates
+    elif cache:
+        index = get_spatial_index(candidates, metric=metric, tree=tree, leaf_size=leaf_size)
+    else:
+        index = SpatialIndex(candidates, metric=metric, tree=tree, leaf_size=leaf_size)
 
     # Find closest points and distances
-    distances, indices = tree.query(src_points, k=k_neighbors)
+    distances, indices = index.query(src_points, k=k_neighbors)
+
+    if all_neighbors:
+        return (indices, distances)
 
     # Transpose to get distances and indices into arrays
     distances = distances.transpose()
@@ -837,49 +1313,45 @@ def get_nearest(src_points, candidates, metric='euclidean', k_neighbors=1):
     return (closest, closest_dist)
 
 
-def nearest_neighbor(left_gdf, right_gdf, metric="euclidean", k_neighbors=1, return_dist=False):
+def nearest_neighbor(left_gdf, right_gdf, metric="euclidean", k_neighbors=1, return_dist=False, tree="ball", leaf_size=15, index=None):
     """Find the nearest neighbor in right_gdf for each point in left_gdf and return the distance between them.
 
     Args:
-        left_gdf (geopandas.GeoDataFrame): GeoDataFrame containing origin locations. This assumes your x and y coordinates are in feet.
-        right_gdf (geopandas.GeoDataFrame): GeoDataFrame containing potential destination locations. This assumes your x and y coordinates are in feet.
-        metric (str, optional): The measure of distance to use to calculate nearest neighbors. Defaults to "euclidean".
+        left_gdf (geopandas.GeoDataFrame): GeoDataFrame containing origin locations. This assumes your x and y coordinates are in feet; for haversine, projected layers are converted to longitude/latitude.
+        right_gdf (geopandas.GeoDataFrame): GeoDataFrame containing potential destination locations. This assumes your x and y coordinates are in feet; for haversine, projected layers are converted to longitude/latitude.
+        metric (str, optional): The measure of distance to use to calculate nearest neighbors, "euclidean" or "haversine" (distances in miles). Defaults to "euclidean".
         k_neighbors (int, optional): Number of nearest neighbors to find. Defaults to 1.
         return_dist (bool, optional): A flag indicating whether distances should be returned. Defaults to False.
+        tree (str, optional): The tree type, either 'ball' or 'kd'. Defaults to 'ball'.
+        leaf_size (int, optional): The leaf size of the tree. Defaults to 15.
+        index (SpatialIndex, optional): A prebuilt index of right_gdf, e.g. from SpatialIndex.from_gdf or SpatialIndex.load. Defaults to None; uses the spatial index cache.
+
+    Raises:
+        ValueError: If index was built with another metric.
 
     Returns:
         closest_points (geopandas.GeoDataFrame): Closest destination locations from right_gdf to each origin location in left_gdf.
     """
 
-    import numpy as np
-
     #For each point in left_gdf, find closest point in right GeoDataFrame and return them.
 
-    left_geom_col = left_gdf.geometry.name
-    right_geom_col = right_gdf.geometry.name
-
-    # Ensure that index in right gdf is formed of sequential numbers
-    right = right_gdf.copy().reset_index(drop=True)
-    
-    if metric == "euclidean":
-        # Parse coordinates from points and insert them into a numpy array as FEET
-        left_measure = np.array(left_gdf[left_geom_col].apply(lambda geom: (geom.x, geom.y)).to_list())
-        right_measure = np.array(right[right_geom_col].apply(lambda geom: (geom.x, geom.y)).to_list())
-    elif metric == "haversine":
-    # Parse coordinates from points and insert them into a numpy array as RADIANS
-        left_radians = np.array(left_gdf[left_geom_col].apply(lambda geom: (geom.x * np.pi / 180, geom.y * np.pi / 180)).to_list())
-        right_radians = np.array(right[right_geom_col].apply(lambda geom: (geom.x * np.pi / 180, geom.y * np.pi / 180)).to_list())
+    # Parse coordinates straight from the geometry arrays: FEET for euclidean, [lat, lon] RADIANS for haversine
+    left_measure = point_coords(left_gdf, metric=metric)
+    if index is not None:
+        right_measure = index
+    else:
+        right_measure = point_coords(right_gdf, metric=metric)
 
-    
     # Find the nearest points
     # -----------------------
-    # closest ==> index in right_gdf that corresponds to the closest point
-    # dist ==> distance between the nearest neighbors (in meters)
+    # closest ==> position in right_gdf that corresponds to the closest point
+    # dist ==> distance between the nearest neighbors (in feet, or radians for haversine)
 
-    closest, dist = get_nearest(src_points=left_measure, candidates=right_measure, metric=metric, k_neighbors=k_neighbors)
+    closest, dist = get_nearest(src_points=left_measure, candidates=right_measure, metric=metric, k_neighbors=k_neighbors, tree=tree, leaf_size=leaf_size)
 
-    # Return points from right GeoDataFrame that are closest to points in left GeoDataFrame
-    closest_points = right.loc[closest]
+    # Return points from right GeoDataFrame that are closest to points in left GeoDataFrame,
+    # taken by position so that right_gdf is not copied as a whole
+    closest_points = right_gdf.iloc[closest]
 
     # Ensure that the index corresponds the one in left_gdf
     closest_points = closest_points.reset_index(drop=True)
@@ -890,8 +1362,7 @@ def nearest_neighbor(left_gdf, right_gdf, metric="euclidean", k_neighbors=1, ret
             closest_points['distance'] = dist
         elif metric == "haversine":
             # Convert to miles from radians
-            earth_radius = 3,958.7558657  # miles
-            closest_points['distance'] = dist * earth_radius
+            closest_points['distance'] = dist * EARTH_RADIUS_MILES
 
     # We should have exactly the same number of closest_points as we have origin locations
     print("# of closest points:", len(closest_points), '==', "# of origin locations:", len(left_gdf))
@@ -899,7 +1370,169 @@ def nearest_neighbor(left_gdf, right_gdf, metric="euclidean", k_neighbors=1, ret
     # Rename the geometry of closest stores gdf so that we can easily identify it
     closest_points = closest_points.rename(columns={'geometry': 'closest_poi_geom'})
     
-    # Merge the datasets by index (for this, it is good to use '.join()' -function)
-    left_gdf = left_gdf.join(closest_points)
-    
-    return closest_points
\ No newline at end of file
+    return closest_points
+
+
+def k_nearest_neighbors(left_gdf, right_gdf, k_neighbors=5, metric="euclidean", max_distance=None, left_id=None, right_id=None, tree="ball", leaf_size=15, index=None, chunksize=100000):
+    """Find the k nearest neighbors in right_gdf for each point in left_gdf as a long table, e.g. the k closest stores of each CBG for choice-set models.
+
+    Args:
+        left_gdf (geopandas.GeoDataFrame): GeoDataFrame containing origin locations. This assumes your x and y coordinates are in feet; for haversine, projected layers are converted to longitude/latitude.
+        right_gdf (geopandas.GeoDataFrame): GeoDataFrame containing potential destination locations. This assumes your x and y coordinates are in feet; for haversine, projected layers are converted to longitude/latitude.
+        k_neighbors (int, optional): Number of nearest neighbors to find; capped at the number of destinations. Defaults to 5.
+        metric (str, optional): The measure of distance, "euclidean" or "haversine" (distances in miles). Defaults to "euclidean".
+        max_distance (float, optional): Neighbors farther than this (in feet, or miles for haversine) are dropped. Defaults to None; keeps all k.
+        left_id (str, optional): Column of left_gdf identifying the origins. Defaults to None; uses the index.
+        right_id (str, optional): Column of right_gdf identifying the destinations. Defaults to None; uses the index.
+        tree (str, optional): The tree type, either 'ball' or 'kd'. Defaults to 'ball'.
+        leaf_size (int, optional): The leaf size of the tree. Defaults to 15.
+        index (SpatialIndex, optional): A prebuilt index of right_gdf. Defaults to None; uses the spatial index cache.
+        chunksize (int, optional): Number of origins queried at a time, which bounds the memory of large k. Defaults to 100000.
+
+    Raises:
+        ValueError: If index was built with another metric.
+
+    Returns:
+        pd.DataFrame: DataFrame with one row per (origin, neighbor) and the columns origin_id, rank (1 is the closest), candidate_id and distance.
+    """
+    left_measure = point_coords(left_gdf, metric=metric)
+    if index is None:
+        index = get_spatial_index(point_coords(right_gdf, metric=metric), metric=metric, tree=tree, leaf_size=leaf_size)
+    else:
+        _check_index_metric(index, metric)
+    k_neighbors = min(k_neighbors, len(index))
+
+    origin_ids = left_gdf.index.to_numpy() if left_id is None else left_gdf[left_id].to_numpy()
+    candidate_ids = right_gdf.index.to_numpy() if right_id is None else right_gdf[right_id].to_numpy()
+    scale = EARTH_RADIUS_MILES if metric == "haversine" else 1.0
+
+    tables = []
+    for start in range(0, left_measure.shape[0], chunksize):
+        stop = start + chunksize
+        indices, distances = get_nearest(left_measure[start:stop], index, metric=metric, k_neighbors=k_neighbors, all_neighbors=True)
+        distances = distances * scale
+        origins = np.repeat(np.arange(start, start + indices.shape[0]), k_neighbors)
+        ranks = np.tile(np.arange(1, k_neighbors + 1), indices.shape[0])
+        indices = indices.ravel()
+        distances = distances.ravel()
+        if max_distance is not None:
+            keep = distances <= max_distance
+            origins, ranks, indices, distances = origins[keep], ranks[keep], indices[keep], distances[keep]
+        tables.append(pd.DataFrame({
+            "origin_id": origin_ids[origins],
+            "rank": ranks,
+            "candidate_id": candidate_ids[indices],
+            "distance": distances,
+        }))
+
+    if len(tables) == 0:
+        return pd.DataFrame({"origin_id": origin_ids[:0], "rank": np.zeros(0, dtype=int), "candidate_id": candidate_ids[:0], "distance": np.zeros(0)})
+    return pd.concat(tables, ignore_index=True)
+
+
+def radius_neighbors(left_gdf, right_gdf, radius, metric="euclidean", count_only=False, tree="ball", leaf_size=15, index=None, chunksize=100000):
+    """Find all points of right_gdf within a radius of each point in left_gdf, e.g. all stores within X miles of each CBG centroid, without building buffer polygons.
+
+    Args:
+        left_gdf (geopandas.GeoDataFrame): GeoDataFrame containing origin locations. This assumes your x and y coordinates are in feet (e.g. EPSG:6576); for haversine, projected layers are converted to longitude/latitude.
+        right_gdf (geopandas.GeoDataFrame): GeoDataFrame containing potential destination locations, in the same units as left_gdf.
+        radius (float): The search radius, in feet (or the units of the projection) for euclidean and miles for haversine.
+        metric (str, optional): The measure of distance, "euclidean" or "haversine". Defaults to "euclidean".
+        count_only (bool, optional): A flag indicating whether only the number of destinations within the radius of each origin should be returned. Defaults to False.
+        tree (str, optional): The tree type, either 'ball' or 'kd'. Defaults to 'ball'.
+        leaf_size (int, optional): The leaf size of the tree. Defaults to 15.
+        index (SpatialIndex, optional): A prebuilt index of right_gdf. Defaults to None; uses the spatial index cache.
+        chunksize (int, optional): Number of origins queried at a time. Defaults to 100000.
+
+    Raises:
+        ValueError: If index was built with another metric.
+
+    Returns:
+        np.array|tuple: The number of destinations within the radius of each origin if count_only is True; otherwise CSR-style indptr, indices and distances arrays, where the destinations (row positions in right_gdf) within the radius of origin i are indices[indptr[i]:indptr[i + 1]], sorted by distance.
+    """
+    left_measure = point_coords(left_gdf, metric=metric)
+    if index is None:
+        index = get_spatial_index(point_coords(right_gdf, metric=metric), metric=metric, tree=tree, leaf_size=leaf_size)
+    else:
+        _check_index_metric(index, metric)
+    scale = EARTH_RADIUS_MILES if metric == "haversine" else 1.0
+
+    counts = []
+    indptrs = [np.zeros(1, dtype=np.int64)]
+    indices = []
+    distances = []
+    for start in range(0, left_measure.shape[0], chunksize):
+        block = left_measure[start:start + chunksize]
+        if count_only:
+            counts.append(index.query_radius(block, radius / scale, count_only=True))
+            continue
+        block_indptr, block_indices, block_distances = index.query_radius(block, radius / scale)
+        indptrs.append(block_indptr[1:] + indptrs[-1][-1])
+        indices.append(block_indices)
+        distances.append(block_distances * scale)
+
+    if count_only:
+        return np.concatenate(counts) if counts else np.zeros(0, dtype=np.int64)
+    if len(indices) == 0:
+        return indptrs[0], np.zeros(0, dtype=np.int64), np.zeros(0)
+    return np.concatenate(indptrs), np.concatenate(indices), np.concatenate(distances)
+
+
+def nearest_neighbor_chunked(left, right_gdf, out_csv, k_neighbors=1, metric="euclidean", left_id=None, right_id=None, chunksize=1000000, n_jobs=-1, tree="ball", leaf_size=15, index=None):
+    """Find the k nearest neighbors in right_gdf of a very large set of origins (e.g. GPS pings) by streaming origin chunks through worker processes that share one built tree, writing the results to disk as they arrive.
+
+    Args:
+        left (geopandas.GeoDataFrame|iterable): GeoDataFrame containing origin locations, or an iterable of GeoDataFrame chunks (e.g. read from disk). This assumes your x and y coordinates are in feet; for haversine, projected layers are converted to longitude/latitude.
+        right_gdf (geopandas.GeoDataFrame): GeoDataFrame containing potential destination locations.
+        out_csv (str): File path of the output CSV (or .csv.gz), with the columns origin_id, rank, candidate_id and distance as in k_nearest_neighbors.
+        k_neighbors (int, optional): Number of nearest neighbors to find. Defaults to 1.
+        metric (str, optional): The measure of distance, "euclidean" or "haversine" (distances in miles). Defaults to "euclidean".
+        left_id (str, optional): Column of the origins identifying them. Defaults to None; uses the index.
+        right_id (str, optional): Column of right_gdf identifying the destinations. Defaults to None; uses the index.
+        chunksize (int, optional): Number of origins per task when left is a GeoDataFrame. Defaults to 1000000.
+        n_jobs (int, optional): Number of worker processes; -1 uses all cores. Defaults to -1.
+        tree (str, optional): The tree type, either 'ball' or 'kd'. Defaults to 'ball'.
+        leaf_size (int, optional): The leaf size of the tree. Defaults to 15.
+        index (SpatialIndex, optional): A prebuilt index of right_gdf. Defaults to None; uses the spatial index cache.
+
+    Raises:
+        ValueError: If index was built with another metric.
+
+    Returns:
+        str: The file path of out_csv.
+    """
+    from collections import deque
+    from .dataprocess import _resolve_n_jobs, _write_csv_chunks
+
+    if index is None:
+        index = get_spatial_index(point_coords(right_gdf, metric=metric), metric=metric, tree=tree, leaf_size=leaf_size)
+    else:
+        _check_index_metric(index, metric)
+    k_neighbors = min(k_neighbors, len(index))
+    candidate_ids = right_gdf.index.to_numpy() if right_id is None else right_gdf[right_id].to_numpy()
+    scale = EARTH_RADIUS_MILES if metric == "haversine" else 1.0
+
+    if isinstance(left, gpd.GeoDataFrame):
+        left_chunks = (left.iloc[start:start + chunksize] for start in range(0, len(left), chunksize))
+    else:
+        left_chunks = left
+
+    # Only coordinates go to the workers; the ids of the chunks in flight wait here
+    pending_ids = deque()
+
+    def coord_chunks():
+        for chunk in left_chunks:
+            pending_ids.append(chunk.index.to_numpy() if left_id is None else chunk[left_id].to_numpy())
+            yield point_coords(chunk, metric=metric)
+
+    def result_tables():
+        for distances, indices in parallel_query(index, coord_chunks(), k=k_neighbors, n_jobs=_resolve_n_jobs(n_jobs)):
+            origin_ids = pending_ids.popleft()
+            yield pd.DataFrame({
+                "origin_id": np.repeat(origin_ids, k_neighbors),
+                "rank": np.tile(np.arange(1, k_neighbors + 1), len(origin_ids)),
+                "candidate_id": candidate_ids[indices.ravel()],
+                "distance": distances.ravel() * scale,
+            })
+
+    return _write_csv_chunks(result_tables(), out_csv, index=False)
@@ -0,0 +1,494 @@
+"""A module of reusable spatial indexes for nearest neighbor, radius, distance and point-in-polygon queries."""
+
+import os
+import hashlib
+import pickle
+from collections import OrderedDict
+import numpy as np
+
+
+EARTH_RADIUS_MILES = 3958.7558657
+
+
+def point_coords(gdf, metric="euclidean"):
+    """Get the coordinates of point geometries as an array, without a Python loop over the geometries.
+
+    Args:
+        gdf (gpd.GeoDataFrame|gpd.GeoSeries): The points.
+        metric (str, optional): The measure of distance the coordinates are used with. For 'haversine', projected layers are converted to longitude/latitude and [lat, lon] radians are returned, as expected by the BallTree. Defaults to 'euclidean'.
+
+    Returns:
+        np.array: Array of shape (n, 2) of [x, y], or [lat, lon] in radians for haversine.
+    """
+    geoms = gdf.geometry
+    if metric == "haversine":
+        if geoms.crs is not None and not geoms.crs.is_geographic:
+            geoms = geoms.to_crs(4326)
+        return np.radians(np.column_stack([geoms.y.to_numpy(), geoms.x.to_numpy()]))
+    return np.column_stack([geoms.x.to_numpy(), geoms.y.to_numpy()])
+
+
+class SpatialIndex:
+    """A KD or Ball tree over a set of candidate points that can be built once, reused across queries and saved to disk.
+
+    Args:
+        coords (np.array): Array of shape (n, 2) of candidate coordinates; [lat, lon] in radians for the haversine metric.
+        metric (str, optional): The measure of distance used by the tree. Defaults to 'euclidean'.
+        tree (str, optional): The tree type, either 'ball' or 'kd'. Defaults to 'ball'.
+        leaf_size (int, optional): The leaf size of the tree. Defaults to 15.
+
+    Raises:
+        ValueError: If the tree type is not recognized or does not support the metric.
+    """
+
+    def __init__(self, coords, metric="euclidean", tree="ball", leaf_size=15):
+        from sklearn.neighbors import BallTree, KDTree
+
+        if tree == "ball":
+            tree_class = BallTree
+        elif tree == "kd":
+            tree_class = KDTree
+        else:
+            raise ValueError("The tree must be either 'ball' or 'kd'.")
+
+        if metric not in tree_class.valid_metrics:
+            raise ValueError("The " + tree + " tree does not support the " + metric + " metric.")
+
+        self.coords = np.ascontiguousarray(coords, dtype=np.float64)
+        self.metric = metric
+        self.tree_type = tree
+        self.leaf_size = leaf_size
+        self.key = index_key(self.coords, metric, tree, leaf_size)
+        self.tree = tree_class(self.coords, leaf_size=leaf_size, metric=metric)
+
+    def __len__(self):
+        return self.coords.shape[0]
+
+    @classmethod
+    def from_gdf(cls, gdf, metric="euclidean", tree="ball", leaf_size=15):
+        """Build a SpatialIndex from the point geometries of a GeoDataFrame.
+
+        Args:
+            gdf (gpd.GeoDataFrame): GeoDataFrame of candidate points; projected (e.g. feet) for 'euclidean', converted to [lat, lon] radians for 'haversine'.
+            metric (str, optional): The measure of distance used by the tree. Defaults to 'euclidean'.
+            tree (str, optional): The tree type, either 'ball' or 'kd'. Defaults to 'ball'.
+            leaf_size (int, optional): The leaf size of the tree. Defaults to 15.
+
+        Returns:
+            SpatialIndex: The index of the points of gdf, in row order.
+        """
+        coords = point_coords(gdf, metric=metric)
+        return cls(coords, metric=metric, tree=tree, leaf_size=leaf_size)
+
+    def query(self, points, k=1):
+        """Find the k nearest candidates of each query point.
+
+        Args:
+            points (np.array): Array of shape (m, 2) of query coordinates in the units of the index.
+            k (int, optional): Number of nearest neighbors to find. Defaults to 1.
+
+        Returns:
+            tuple: np.arrays of shape (m, k) of the distances and the positions of the nearest candidates.
+        """
+        return self.tree.query(points, k=k)
+
+    def query_radius(self, points, radius, count_only=False, sort_results=True):
+        """Find all candidates within a radius of each query point as CSR-style neighbor lists.
+
+        Args:
+            points (np.array): Array of shape (m, 2) of query coordinates in the units of the index.
+            radius (float): The search radius in the units of the index (radians for haversine).
+            count_only (bool, optional): A flag indicating whether only the number of candidates within the radius should be returned. Defaults to False.
+            sort_results (bool, optional): A flag indicating whether the neighbors of each point should be sorted by distance. Defaults to True.
+
+        Returns:
+            np.array|tuple: The counts per point if count_only is True; otherwise the indptr, indices and distances arrays, where the neighbors of point i are indices[indptr[i]:indptr[i + 1]].
+        """
+        if count_only:
+            return self.tree.query_radius(points, radius, count_only=True)
+
+        indices, distances = self.tree.query_radius(
+            points, radius, return_distance=True, sort_results=sort_results
+        )
+        counts = np.fromiter(map(len, indices), dtype=np.int64, count=len(indices))
+        indptr = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        if len(indices) == 0 or indptr[-1] == 0:
+            return indptr, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+        return indptr, np.concatenate(indices), np.concatenate(distances)
+
+    def save(self, out_file):
+        """Save the SpatialIndex, including its built tree, to a file.
+
+        Args:
+            out_file (str): The file path of the output file.
+        """
+        out_file = os.path.abspath(out_file)
+        out_dir = os.path.dirname(out_file)
+        if not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+        with open(out_file, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, in_file, cache=True):
+        """Load a SpatialIndex saved with SpatialIndex.save.
+
+        Args:
+            in_file (str): The file path to the saved index.
+            cache (bool, optional): A flag indicating whether the index should be added to the index cache so that later queries on the same candidates reuse it. Defaults to True.
+
+        Raises:
+            FileNotFoundError: If the provided file path does not exist.
+
+        Returns:
+            SpatialIndex: The loaded index.
+        """
+        if not os.path.exists(in_file):
+            raise FileNotFoundError("The provided index file could not be found.")
+        with open(in_file, "rb") as f:
+            index = pickle.load(f)
+        if cache:
+            _cache_index(index)
+        return index
+
+
+class PolygonIndex:
+    """A polygon layer (e.g. census block groups) with a spatial index, built once and queried with many points in vectorized batches.
+
+    Args:
+        polygons (str|gpd.GeoDataFrame): The file path to a polygon layer (e.g. KnoxCountyBlockGroup.shp) or a GeoDataFrame of polygons.
+        columns (list, optional): Attribute columns kept and returned by queries. Defaults to None; all columns.
+
+    Raises:
+        FileNotFoundError: If the provided file path does not exist.
+        TypeError: If polygons is not a str or gpd.GeoDataFrame.
+    """
+
+    def __init__(self, polygons, columns=None):
+        import geopandas as gpd
+
+        if isinstance(polygons, str):
+            if not os.path.exists(polygons):
+                raise FileNotFoundError("The provided polygon layer could not be found.")
+            polygons = gpd.read_file(polygons)
+        elif not isinstance(polygons, gpd.GeoDataFrame):
+            raise TypeError("The polygon layer must be a type of str or geopandas.GeoDataFrame.")
+
+        if columns is not None:
+            polygons = polygons[list(columns) + [polygons.geometry.name]]
+        self.polygons = polygons.reset_index(drop=True)
+        self.crs = self.polygons.crs
+        self.sindex = self.polygons.sindex
+
+    def __len__(self):
+        return self.polygons.shape[0]
+
+    def __getstate__(self):
+        # The spatial index is rebuilt on load rather than pickled
+        return {"polygons": self.polygons, "crs": self.crs}
+
+    def __setstate__(self, state):
+        self.polygons = state["polygons"]
+        self.crs = state["crs"]
+        self.sindex = self.polygons.sindex
+
+    def locate(self, points, batch_size=1000000):
+        """Find the position of the polygon containing each point.
+
+        Points strictly inside a polygon are matched first; only the remaining points are tested against polygon boundaries, so a point exactly on an edge shared by two polygons is assigned to the one that comes first in the layer.
+
+        Args:
+            points (gpd.GeoDataFrame|gpd.GeoSeries|np.array): The points, or an array of shape (n, 2) of x and y in the coordinate system of the polygons. Points in another coordinate system are reprojected.
+            batch_size (int, optional): Number of points tested at a time. Defaults to 1000000.
+
+        Returns:
+            np.array: The row position in the polygon layer of each point, or -1 for points outside every polygon.
+        """
+        import geopandas as gpd
+
+        if isinstance(points, np.ndarray):
+            geoms = gpd.GeoSeries(gpd.points_from_xy(points[:, 0], points[:, 1]), crs=self.crs)
+        else:
+            geoms = points.geometry
+            if self.crs is not None and geoms.crs is not None and geoms.crs != self.crs:
+                geoms = geoms.to_crs(self.crs)
+        geoms = geoms.values
+
+        missing = len(self)
+        positions = np.full(len(geoms), missing, dtype=np.int64)
+        for start in range(0, len(geoms), batch_size):
+            batch = geoms[start:start + batch_size]
+            found = positions[start:start + batch_size]
+            inputs, polys = self.sindex.query(batch, predicate="within")
+            np.minimum.at(found, inputs, polys)
+
+            # Fall back to a boundary test for the points on an edge
+            edge = np.flatnonzero(found == missing)
+            if len(edge) > 0:
+                inputs, polys = self.sindex.query(batch[edge], predicate="intersects")
+                np.minimum.at(found, edge[inputs], polys)
+
+        positions[positions == missing] = -1
+        return positions
+
+    def query(self, points, columns=None, batch_size=1000000):
+        """Get the attributes of the polygon containing each point, e.g. the GEOID of the block group of each GPS ping or POI.
+
+        Args:
+            points (gpd.GeoDataFrame|gpd.GeoSeries|np.array): The points, or an array of shape (n, 2) of x and y in the coordinate system of the polygons.
+            columns (list, optional): Attribute columns to return. Defaults to None; all columns kept by the index.
+            batch_size (int, optional): Number of points tested at a time. Defaults to 1000000.
+
+        Returns:
+            pd.DataFrame: The polygon attributes of each point, with the index of points (or a RangeIndex for arrays); missing values for points outside every polygon.
+        """
+        import pandas as pd
+
+        positions = self.locate(points, batch_size=batch_size)
+        if columns is None:
+            columns = [col for col in self.polygons.columns if col != self.polygons.geometry.name]
+        attributes = pd.DataFrame(self.polygons[columns]).reindex(positions)
+        if isinstance(points, np.ndarray):
+            attributes.index = pd.RangeIndex(len(positions))
+        else:
+            attributes.index = points.index
+        return attributes
+
+    def save(self, out_file):
+        """Save the PolygonIndex to a file.
+
+        Args:
+            out_file (str): The file path of the output file.
+        """
+        out_file = os.path.abspath(out_file)
+        out_dir = os.path.dirname(out_file)
+        if not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+        with open(out_file, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, in_file):
+        """Load a PolygonIndex saved with PolygonIndex.save.
+
+        Args:
+            in_file (str): The file path to the saved index.
+
+        Raises:
+            FileNotFoundError: If the provided file path does not exist.
+
+        Returns:
+            PolygonIndex: The loaded index.
+        """
+        if not os.path.exists(in_file):
+            raise FileNotFoundError("The provided index file could not be found.")
+        with open(in_file, "rb") as f:
+            return pickle.load(f)
+
+
+def parallel_query(index, chunks, k=1, n_jobs=2):
+    """Query an index with a stream of coordinate chunks across worker processes, yielding results in chunk order.
+
+    The index is saved once and loaded once by each worker when it starts, so it is not pickled with every task. At most 2 * n_jobs chunks are in flight, which bounds memory.
+
+    Args:
+        index (SpatialIndex): The index to be queried.
+        chunks (iterable): Arrays of shape (m, 2) of query coordinates in the units of the index.
+        k (int, optional): Number of nearest neighbors to find. Defaults to 1.
+        n_jobs (int, optional): Number of worker processes; 1 queries in this process. Defaults to 2.
+
+    Returns:
+        generator: The (distances, indices) arrays of shape (m, k) of each chunk.
+    """
+    import shutil
+    import tempfile
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    if n_jobs == 1:
+        for chunk in chunks:
+            yield index.query(chunk, k=k)
+        return
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        index_file = os.path.join(tmp_dir, "index.pkl")
+        index.save(index_file)
+        with ProcessPoolExecutor(
+            max_workers=n_jobs, initializer=_init_query_worker, initargs=(index_file,)
+        ) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(_query_worker, chunk, k))
+                if len(pending) >= 2 * n_jobs:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+_WORKER_INDEX = [None]
+
+
+def _init_query_worker(index_file):
+    """Load the shared index once in a worker process."""
+    _WORKER_INDEX[0] = SpatialIndex.load(index_file, cache=False)
+
+
+def _query_worker(chunk, k):
+    """Query the index of the worker process."""
+    return _WORKER_INDEX[0].query(chunk, k=k)
+
+
+def distance_matrix(
+    left_gdf,
+    right_gdf,
+    metric="haversine",
+    dtype="float32",
+    block_size=4096,
+    out_npy=None,
+    earth_radius=EARTH_RADIUS_MILES,
+):
+    """Compute the full matrix of distances between two sets of points, e.g. CBG centroids by stores, in memory-capped blocks.
+
+    Args:
+        left_gdf (gpd.GeoDataFrame): The origin points; rows of the matrix.
+        right_gdf (gpd.GeoDataFrame): The destination points; columns of the matrix.
+        metric (str, optional): 'haversine', 'great_circle' (the Vincenty formula on a sphere, accurate for near-antipodal points) or 'euclidean' (in the units of the projection, e.g. feet for EPSG:6576). Projected layers are converted to longitude/latitude for the spherical metrics. Defaults to 'haversine'.
+        dtype (str, optional): dtype of the matrix. Defaults to 'float32'.
+        block_size (int, optional): Number of rows and of columns computed per block, which caps the memory of temporaries. Defaults to 4096.
+        out_npy (str, optional): The file path of a .npy the matrix is written to as a memory map, for matrices larger than memory. Defaults to None; the matrix is held in memory.
+        earth_radius (float, optional): Radius of the earth for the spherical metrics, which sets their units. Defaults to 3958.7558657 (miles).
+
+    Raises:
+        ValueError: If the metric is not recognized.
+
+    Returns:
+        np.array: Array of shape (len(left_gdf), len(right_gdf)) of distances; a np.memmap if out_npy is given.
+    """
+    if metric == "euclidean":
+        kernel = _euclidean_block
+        left, right = point_coords(left_gdf), point_coords(right_gdf)
+    elif metric in ("haversine", "great_circle"):
+        kernel = _haversine_block if metric == "haversine" else _great_circle_block
+        left = point_coords(left_gdf, metric="haversine")
+        right = point_coords(right_gdf, metric="haversine")
+    else:
+        raise ValueError("The metric must be one of 'haversine', 'great_circle' or 'euclidean'.")
+
+    shape = (left.shape[0], right.shape[0])
+    if out_npy is not None:
+        out_npy = os.path.abspath(out_npy)
+        out_dir = os.path.dirname(out_npy)
+        if not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+        matrix = np.lib.format.open_memmap(out_npy, mode="w+", dtype=dtype, shape=shape)
+    else:
+        matrix = np.empty(shape, dtype=dtype)
+
+    for i in range(0, shape[0], block_size):
+        for j in range(0, shape[1], block_size):
+            block = kernel(left[i:i + block_size], right[j:j + block_size])
+            if metric != "euclidean":
+                block *= earth_radius
+            matrix[i:i + block_size, j:j + block_size] = block
+
+    if out_npy is not None:
+        matrix.flush()
+    return matrix
+
+
+def _euclidean_block(left, right):
+    """Euclidean distances between two blocks of [x, y] points."""
+    dx = left[:, 0:1] - right[:, 0]
+    dy = left[:, 1:2] - right[:, 1]
+    return np.hypot(dx, dy)
+
+
+def _haversine_block(left, right):
+    """Central angles between two blocks of [lat, lon] radian points by the haversine formula."""
+    lat1, lon1 = left[:, 0:1], left[:, 1:2]
+    lat2, lon2 = right[:, 0], right[:, 1]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _great_circle_block(left, right):
+    """Central angles between two blocks of [lat, lon] radian points by the Vincenty formula on a sphere."""
+    lat1, lon1 = left[:, 0:1], left[:, 1:2]
+    lat2, lon2 = right[:, 0], right[:, 1]
+    dlon = lon2 - lon1
+    sin_lat1, cos_lat1 = np.sin(lat1), np.cos(lat1)
+    sin_lat2, cos_lat2 = np.sin(lat2), np.cos(lat2)
+    y = np.hypot(cos_lat2 * np.sin(dlon), cos_lat1 * sin_lat2 - sin_lat1 * cos_lat2 * np.cos(dlon))
+    x = sin_lat1 * sin_lat2 + cos_lat1 * cos_lat2 * np.cos(dlon)
+    return np.arctan2(y, x)
+
+
+def index_key(coords, metric="euclidean", tree="ball", leaf_size=15):
+    """Hash candidate coordinates and tree settings into the key of the index cache.
+
+    Args:
+        coords (np.array): Array of shape (n, 2) of candidate coordinates.
+        metric (str, optional): The measure of distance. Defaults to 'euclidean'.
+        tree (str, optional): The tree type. Defaults to 'ball'.
+        leaf_size (int, optional): The leaf size of the tree. Defaults to 15.
+
+    Returns:
+        str: A hex digest identifying the index.
+    """
+    coords = np.ascontiguousarray(coords, dtype=np.float64)
+    digest = hashlib.sha1(coords.tobytes())
+    digest.update(str((coords.shape, metric, tree, leaf_size)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+_INDEX_CACHE = OrderedDict()
+_INDEX_CACHE_SIZE = [8]
+
+
+def get_spatial_index(coords, metric="euclidean", tree="ball", leaf_size=15):
+    """Get a SpatialIndex of the candidate coordinates, reusing a cached one built from the same coordinates and settings.
+
+    Args:
+        coords (np.array): Array of shape (n, 2) of candidate coordinates.
+        metric (str, optional): The measure of distance. Defaults to 'euclidean'.
+        tree (str, optional): The tree type, either 'ball' or 'kd'. Defaults to 'ball'.
+        leaf_size (int, optional): The leaf size of the tree. Defaults to 15.
+
+    Returns:
+        SpatialIndex: The cached or newly built index.
+    """
+    key = index_key(coords, metric, tree, leaf_size)
+    if key in _INDEX_CACHE:
+        _INDEX_CACHE.move_to_end(key)
+        return _INDEX_CACHE[key]
+    index = SpatialIndex(coords, metric=metric, tree=tree, leaf_size=leaf_size)
+    _cache_index(index)
+    return index
+
+
+def _cache_index(index):
+    """Add an index to the cache, evicting the least recently used ones beyond the cache size."""
+    _INDEX_CACHE[index.key] = index
+    _INDEX_CACHE.move_to_end(index.key)
+    while len(_INDEX_CACHE) > _INDEX_CACHE_SIZE[0]:
+        _INDEX_CACHE.popitem(last=False)
+
+
+def set_spatial_index_cache_size(size):
+    """Set how many spatial indexes are kept in the cache.
+
+    Args:
+        size (int): The maximum number of cached indexes; 0 disables the cache.
+    """
+    _INDEX_CACHE_SIZE[0] = size
+    while len(_INDEX_CACHE) > size:
+        _INDEX_CACHE.popitem(last=False)
+
+
+def clear_spatial_index_cache():
+    """Remove all spatial indexes from the cache."""
+    _INDEX_CACHE.clear()
@@ -0,0 +1,327 @@
+"""A module for turning GPS traces, e.g. from gmapjson_to_gdf, into stays and moves.
+
+Every function takes one table of pings for one or many users and works on all of them at once: pings are sorted by user and time, stays are found with one forward sweep over all pings and trips with run-length encoding, rather than per-point loops. Distances are in meters and times in seconds.
+"""
+
+import numpy as np
+import pandas as pd
+from .spatial import EARTH_RADIUS_MILES
+
+EARTH_RADIUS_METERS = EARTH_RADIUS_MILES * 1609.344
+
+
+def _haversine(lat1, lon1, lat2, lon2):
+    """Great circle distance in meters between arrays of points in degrees."""
+    lat1, lon1, lat2, lon2 = (np.radians(values) for values in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.minimum(a, 1)))
+
+
+class _Pings:
+    """The pings of a table as arrays sorted by user and time, with the steps between consecutive pings of a user."""
+
+    def __init__(self, df, user_col, time_col, lat_col, lon_col):
+        times = pd.to_datetime(df[time_col], utc=True).dt.tz_convert(None).to_numpy(dtype="datetime64[ns]")
+        nanoseconds = times.astype(np.int64)
+        if user_col is None:
+            codes = np.zeros(len(df), dtype=np.int64)
+            self.users = None
+        else:
+            codes, self.users = pd.factorize(df[user_col], sort=True)
+
+        self.order = np.lexsort((nanoseconds, codes))
+        self.codes = codes[self.order]
+        self.nanoseconds = nanoseconds[self.order]
+        self.seconds = self.nanoseconds / 1e9
+        self.lat = df[lat_col].to_numpy(dtype=np.float64)[self.order]
+        self.lon = df[lon_col].to_numpy(dtype=np.float64)[self.order]
+
+        # Steps into each ping from the previous ping of the same user; the first ping of a user has none
+        self.new_user = np.ones(len(df), dtype=bool)
+        self.new_user[1:] = self.codes[1:] != self.codes[:-1]
+        self.step = np.full(len(df), np.inf)
+        self.step[1:] = _haversine(self.lat[:-1], self.lon[:-1], self.lat[1:], self.lon[1:])
+        self.step[self.new_user] = np.inf
+        self.elapsed = np.full(len(df), np.inf)
+        self.elapsed[1:] = np.diff(self.seconds)
+        self.elapsed[self.new_user] = np.inf
+
+    def __len__(self):
+        return len(self.order)
+
+
+def _run_bounds(starts):
+    """The first and one-past-last positions of the runs beginning where starts is True."""
+    first = np.flatnonzero(starts)
+    last = np.append(first[1:], len(starts))
+    return first, last
+
+
+def filter_speed_outliers(df, max_speed=55.0, user_col=None, time_col="timestamp", lat_col="latitude", lon_col="longitude", max_passes=5):
+    """Drop pings that imply an impossible speed, e.g. GPS jumps to a distant cell tower and back.
+
+    A ping is an outlier when the speeds into it and out of it both exceed max_speed (or the one speed it has, at the ends of a trace). Pings are dropped and speeds recomputed until none remains or max_passes is reached.
+
+    Args:
+        df (pd.DataFrame|gpd.GeoDataFrame): The pings, e.g. from gmapjson_to_gdf.
+        max_speed (float, optional): The highest plausible speed, in meters per second. Defaults to 55.0 (about 200 km/h).
+        user_col (str, optional): Column identifying the user of each ping. Defaults to None; one user.
+        time_col (str, optional): Column of ping times. Defaults to "timestamp".
+        lat_col (str, optional): Column of latitudes. Defaults to "latitude".
+        lon_col (str, optional): Column of longitudes. Defaults to "longitude".
+        max_passes (int, optional): The largest number of passes. Defaults to 5.
+
+    Returns:
+        pd.DataFrame|gpd.GeoDataFrame: The pings that are not outliers, sorted by user and time.
+    """
+    for _ in range(max_passes):
+        pings = _Pings(df, user_col, time_col, lat_col, lon_col)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            speed_in = np.where(pings.step == 0, 0, pings.step / pings.elapsed)
+        speed_in[pings.new_user] = np.nan
+        speed_out = np.append(speed_in[1:], np.nan)
+
+        too_fast_in = speed_in > max_speed
+        too_fast_out = speed_out > max_speed
+        has_in = ~np.isnan(speed_in)
+        has_out = ~np.isnan(speed_out)
+        outlier = np.where(has_in & has_out, too_fast_in & too_fast_out, too_fast_in | too_fast_out)
+
+        df = df.iloc[pings.order[~outlier]]
+        if not outlier.any():
+            break
+    return df
+
+
+def label_trajectory(df, distance=200.0, duration=1200.0, user_col=None, time_col="timestamp", lat_col="latitude", lon_col="longitude"):
+    """Label each ping with the stay or trip it belongs to.
+
+    As in classic stay point detection, a stay is anchored at its first ping and holds the pings that follow while they lie within distance of the anchor, as long as they span at least duration; the next stay is looked for from the first ping past it. The pings between two stays of a user form a trip.
+
+    Args:
+        df (pd.DataFrame|gpd.GeoDataFrame): The pings, e.g. from gmapjson_to_gdf.
+        distance (float, optional): The distance threshold of stays, in meters. Defaults to 200.0.
+        duration (float, optional): The shortest stay, in seconds. Defaults to 1200.0 (20 minutes).
+        user_col (str, optional): Column identifying the user of each ping. Defaults to None; one user.
+        time_col (str, optional): Column of ping times. Defaults to "timestamp".
+        lat_col (str, optional): Column of latitudes. Defaults to "latitude".
+        lon_col (str, optional): Column of longitudes. Defaults to "longitude".
+
+    Returns:
+        pd.DataFrame|gpd.GeoDataFrame: The pings sorted by user and time, with 'stay_id' and 'trip_id' columns numbered across all users; -1 where a ping is not in a stay or not in a trip.
+    """
+    pings = _Pings(df, user_col, time_col, lat_col, lon_col)
+    stay_id, trip_id = _label(pings, distance, duration)
+    labelled = df.iloc[pings.order].copy()
+    labelled["stay_id"] = stay_id
+    labelled["trip_id"] = trip_id
+    return labelled
+
+
+def _label(pings, distance, duration):
+    """The stay and trip of each sorted ping."""
+    n = len(pings)
+    stay_id = np.full(n, -1, dtype=np.int64)
+    trip_id = np.full(n, -1, dtype=np.int64)
+    if n == 0:
+        return stay_id, trip_id
+
+    first, last = _run_bounds(pings.new_user)
+    user_end = np.repeat(last, last - first)
+
+    # Sweep every ping forward at once while the next ping is within distance of it, until its window lasts duration
+    reach = np.arange(1, n + 1)
+    active = np.arange(n)
+    while len(active):
+        following = reach[active]
+        near = following < user_end[active]
+        near[near] = _haversine(pings.lat[active[near]], pings.lon[active[near]], pings.lat[following[near]], pings.lon[following[near]]) <= distance
+        active = active[near]
+        reach[active] += 1
+        active = active[pings.seconds[reach[active] - 1] - pings.seconds[active] < duration]
+    anchors = np.flatnonzero((reach - np.arange(n) > 1) & (pings.seconds[reach - 1] - pings.seconds >= duration))
+
+    # Take the first anchor, extend its stay to the first ping out of distance and look for the next anchor past it
+    starts, ends = [], []
+    position = 0
+    while position < len(anchors):
+        anchor = anchors[position]
+        end = _stay_end(pings, anchor, reach[anchor], user_end[anchor], distance)
+        starts.append(anchor)
+        ends.append(end)
+        position = np.searchsorted(anchors, end)
+
+    starts = np.asarray(starts, dtype=np.int64)
+    counts = np.asarray(ends, dtype=np.int64) - starts
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    stay_id[np.repeat(starts, counts) + offsets] = np.repeat(np.arange(len(counts)), counts)
+
+    moving = stay_id < 0
+    trip_start = moving & (pings.new_user | np.append(True, ~moving[:-1]))
+    trip_numbers = np.cumsum(trip_start) - 1
+    trip_id[moving] = trip_numbers[moving]
+    return stay_id, trip_id
+
+
+def _stay_end(pings, anchor, start, stop, distance):
+    """One past the last ping of the stay at anchor, the first ping from start on that lies farther than distance from it."""
+    block = 64
+    while start < stop:
+        end = min(start + block, stop)
+        far = np.flatnonzero(_haversine(pings.lat[anchor], pings.lon[anchor], pings.lat[start:end], pings.lon[start:end]) > distance)
+        if len(far):
+            return start + far[0]
+        start = end
+        block *= 2
+    return stop
+
+
+def stay_points(df, distance=200.0, duration=1200.0, user_col=None, time_col="timestamp", lat_col="latitude", lon_col="longitude"):
+    """Detect stay points, places where a user stayed within a distance for at least a duration.
+
+    Args:
+        df (pd.DataFrame|gpd.GeoDataFrame): The pings, e.g. from gmapjson_to_gdf.
+        distance (float, optional): The distance threshold of stays, in meters. Defaults to 200.0.
+        duration (float, optional): The shortest stay, in seconds. Defaults to 1200.0 (20 minutes).
+        user_col (str, optional): Column identifying the user of each ping. Defaults to None; one user.
+        time_col (str, optional): Column of ping times. Defaults to "timestamp".
+        lat_col (str, optional): Column of latitudes. Defaults to "latitude".
+        lon_col (str, optional): Column of longitudes. Defaults to "longitude".
+
+    Returns:
+        pd.DataFrame: One row per stay with its user (if user_col is given), start and end times, duration in seconds, number of pings and centroid latitude and longitude, indexed by stay_id.
+    """
+    pings = _Pings(df, user_col, time_col, lat_col, lon_col)
+    stay_id, _ = _label(pings, distance, duration)
+    return _summarize(pings, stay_id, user_col, lat_col, lon_col, "stay_id")
+
+
+def segment_trips(df, distance=200.0, duration=1200.0, user_col=None, time_col="timestamp", lat_col="latitude", lon_col="longitude"):
+    """Segment traces into trips, the runs of pings between the stay points of each user.
+
+    Args:
+        df (pd.DataFrame|gpd.GeoDataFrame): The pings, e.g. from gmapjson_to_gdf.
+        distance (float, optional): The distance threshold of stays, in meters. Defaults to 200.0.
+        duration (float, optional): The shortest stay, in seconds. Defaults to 1200.0 (20 minutes).
+        user_col (str, optional): Column identifying the user of each ping. Defaults to None; one user.
+        time_col (str, optional): Column of ping times. Defaults to "timestamp".
+        lat_col (str, optional): Column of latitudes. Defaults to "latitude".
+        lon_col (str, optional): Column of longitudes. Defaults to "longitude".
+
+    Returns:
+        pd.DataFrame: One row per trip with its user (if user_col is given), start and end times, duration in seconds, number of pings, length in meters along its pings, and the stay_id it leaves from and arrives at (-1 at the ends of a trace), indexed by trip_id.
+    """
+    pings = _Pings(df, user_col, time_col, lat_col, lon_col)
+    stay_id, trip_id = _label(pings, distance, duration)
+    trips = _summarize(pings, trip_id, user_col, lat_col, lon_col, "trip_id", centroid=False)
+
+    starts = np.append(True, trip_id[1:] != trip_id[:-1])
+    first, last = _run_bounds(starts)
+    keep = trip_id[first] >= 0
+    inner_steps = np.where(starts, 0, pings.step)
+    trips["length"] = _run_sums(inner_steps, trip_id)[keep]
+
+    # The stays just before and just after each trip, if they belong to the same user
+    n = len(pings)
+    first, last = first[keep], last[keep]
+    origin = np.where(pings.new_user[first], -1, stay_id[np.maximum(first - 1, 0)])
+    follows = last < n
+    follows[follows] = ~pings.new_user[last[follows]]
+    destination = np.where(follows, stay_id[np.minimum(last, n - 1)], -1)
+    trips["origin_stay"] = origin
+    trips["destination_stay"] = destination
+    return trips
+
+
+def _summarize(pings, labels, user_col, lat_col, lon_col, name, centroid=True):
+    """One row per label of the sorted pings, skipping pings labelled -1."""
+    first, last = _run_bounds(np.append(True, labels[1:] != labels[:-1]))
+    keep = labels[first] >= 0
+    counts = (last - first)[keep]
+
+    summary = pd.DataFrame(index=pd.Index(labels[first][keep], name=name))
+    first, last = first[keep], last[keep]
+    if user_col is not None:
+        summary[user_col] = pings.users[pings.codes[first]]
+    summary["start"] = pd.to_datetime(pings.nanoseconds[first], utc=True)
+    summary["end"] = pd.to_datetime(pings.nanoseconds[last - 1], utc=True)
+    summary["duration"] = pings.seconds[last - 1] - pings.seconds[first]
+    summary["n_points"] = counts
+    if centroid:
+        summary[lat_col] = _run_sums(pings.lat, labels)[keep] / counts
+        summary[lon_col] = _run_sums(pings.lon, labels)[keep] / counts
+    return summary
+
+
+def _run_sums(values, labels):
+    """Sum values over each run of equal consecutive labels."""
+    first, _ = _run_bounds(np.append(True, labels[1:] != labels[:-1]))
+    if len(first) == 0:
+        return np.zeros(0)
+    return np.add.reduceat(values, first)
+
+
+def resample(df, freq="1min", user_col=None, time_col="timestamp", lat_col="latitude", lon_col="longitude", method="linear", max_gap=None):
+    """Resample traces onto a regular time grid, e.g. one position per minute for every user.
+
+    Args:
+        df (pd.DataFrame|gpd.GeoDataFrame): The pings, e.g. from gmapjson_to_gdf.
+        freq (str|pd.Timedelta, optional): The spacing of the grid, which is aligned to multiples of freq. Defaults to "1min".
+        user_col (str, optional): Column identifying the user of each ping. Defaults to None; one user.
+        time_col (str, optional): Column of ping times. Defaults to "timestamp".
+        lat_col (str, optional): Column of latitudes. Defaults to "latitude".
+        lon_col (str, optional): Column of longitudes. Defaults to "longitude".
+        method (str, optional): 'linear' interpolates between the pings around each grid time, 'previous' takes the last ping at or before it. Defaults to "linear".
+        max_gap (str|pd.Timedelta, optional): Grid times between pings further apart than this get no position. Defaults to None; no limit.
+
+    Raises:
+        ValueError: If the method is not recognized.
+
+    Returns:
+        pd.DataFrame: The user (if user_col is given), time and position at each grid time from the first to the last ping of each user; positions are NaN in gaps longer than max_gap.
+    """
+    if method not in ("linear", "previous"):
+        raise ValueError("The method must be either 'linear' or 'previous'.")
+
+    pings = _Pings(df, user_col, time_col, lat_col, lon_col)
+    step = pd.Timedelta(freq).value
+    first, last = _run_bounds(pings.new_user)
+
+    # Grid times of every user, concatenated
+    grid_start = -(-pings.nanoseconds[first] // step) * step
+    grid_end = pings.nanoseconds[last - 1] // step * step
+    counts = np.maximum((grid_end - grid_start) // step + 1, 0) if len(first) else np.zeros(0, dtype=np.int64)
+    owner = np.repeat(np.arange(len(first)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    grid = grid_start[owner] + offsets * step
+
+    # Offset the times of each user past the previous one, so one search covers all users
+    origin = pings.nanoseconds.min() if len(pings) else 0
+    span = float(pings.nanoseconds.max() - origin + step) if len(pings) else 1.0
+    times = (pings.nanoseconds - origin) + pings.codes * span
+    grid_times = (grid - origin) + pings.codes[first][owner] * span
+    before = np.searchsorted(times, grid_times, side="right") - 1
+    after = np.minimum(before + 1, len(pings) - 1)
+    # A grid time on a ping is not inside a gap, even when the next ping belongs to another user
+    gap = np.where(times[before] == grid_times, 0, times[after] - times[before])
+
+    if method == "linear":
+        weight = np.divide(grid_times - times[before], gap, out=np.zeros(len(grid)), where=gap > 0)
+        lat = pings.lat[before] + weight * (pings.lat[after] - pings.lat[before])
+        lon = pings.lon[before] + weight * (pings.lon[after] - pings.lon[before])
+    else:
+        lat = pings.lat[before]
+        lon = pings.lon[before]
+
+    if max_gap is not None:
+        too_long = gap > pd.Timedelta(max_gap).value
+        lat = np.where(too_long, np.nan, lat)
+        lon = np.where(too_long, np.nan, lon)
+
+    resampled = pd.DataFrame()
+    if user_col is not None:
+        resampled[user_col] = pings.users[pings.codes[first][owner]] if len(grid) else pings.users[:0]
+    resampled[time_col] = pd.to_datetime(grid, utc=True)
+    resampled[lat_col] = lat
+    resampled[lon_col] = lon
+    return resampled
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+"""Tests for `accessibility` package."""
+
+import os
+import unittest
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from hagerstrand import accessibility
+
+
+class TestAccessibility(unittest.TestCase):
+    """Tests for `accessibility` package."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        print("setUp")
+        self.in_csv = os.path.join("examples", "data", "cbg_store_drivetime.csv")
+        self.cost, self.origins, self.destinations = accessibility.od_matrix(self.in_csv)
+        self.attractiveness = np.random.default_rng(0).uniform(1, 5, self.cost.shape[1])
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        print("tearDown\n")
+
+    def test_od_matrix(self):
+        print("test_od_matrix")
+        self.assertEqual(self.cost.shape, (242, 142))
+        self.assertEqual(self.origins[0], "470930001001")
+        near, _, _ = accessibility.od_matrix(self.in_csv, max_cost=10, origins=self.origins)
+        self.assertEqual(near.shape[0], 242)
+        self.assertLessEqual(near.data.max(), 10)
+
+    def test_align_flows(self):
+        print("test_align_flows")
+        flows = sparse.csr_matrix(np.array([[1, 2], [3, 4]]))
+        aligned = accessibility.align_flows(flows, ["a", "z"], [7, 7], pd.Index(["b", "a"]), pd.Index([6, 7]))
+        np.testing.assert_array_equal(aligned.toarray(), [[0, 0], [0, 3]])
+
+    def test_huff_model(self):
+        print("test_huff_model")
+        prob = accessibility.huff_model(self.cost, self.attractiveness, block_size=50)
+        np.testing.assert_allclose(prob.sum(axis=1), 1)
+        dense = self.cost.toarray()
+        dense[dense == 0] = np.inf
+        np.testing.assert_allclose(accessibility.huff_model(dense, self.attractiveness), prob.toarray(), atol=1e-12)
+
+    def test_calibrate_huff(self):
+        print("test_calibrate_huff")
+        expected = accessibility.huff_model(self.cost, self.attractiveness, alpha=0.7, beta=1.5)
+        observed = expected.multiply(1000).tocsr()
+        fitted = accessibility.calibrate_huff(self.cost, self.attractiveness, observed, block_size=100)
+        self.assertTrue(fitted["converged"])
+        self.assertAlmostEqual(fitted["alpha"], 0.7, places=3)
+        self.assertAlmostEqual(fitted["beta"], 1.5, places=3)
+
+    def test_two_step_fca(self):
+        print("test_two_step_fca")
+        demand = np.random.default_rng(1).integers(500, 3000, self.cost.shape[0])
+        scores = accessibility.two_step_fca(self.cost, self.attractiveness, demand, 15)
+        dense = self.cost.toarray()
+        within = (dense <= 15) & (dense > 0)
+        catchment_demand = within.T @ demand
+        ratios = np.divide(self.attractiveness, catchment_demand, out=np.zeros(len(catchment_demand)), where=catchment_demand > 0)
+        np.testing.assert_allclose(scores, within @ ratios)
+        model = accessibility.FloatingCatchment(self.cost, 15, kernel="stepwise")
+        self.assertEqual(model.shape, self.cost.shape)
+        self.assertLessEqual(model.weights.data.max(), 1.0)
+        np.testing.assert_allclose(model.scores(2 * self.attractiveness, demand), 2 * model.scores(self.attractiveness, demand))
+
+    def test_distance_decay(self):
+        print("test_distance_decay")
+        cost = np.array([[1.0, 5.0, np.inf], [9.0, 10.0, 12.0]])
+        stepwise = accessibility.distance_decay(cost, 10, kernel="stepwise", steps=[(4, 1.0), (10, 0.5)])
+        np.testing.assert_allclose(stepwise.toarray(), [[1.0, 0.5, 0], [0.5, 0.5, 0]])
+        gaussian = accessibility.distance_decay(cost, 10, kernel="gaussian").toarray()
+        self.assertAlmostEqual(gaussian[1, 1], 0)
+        self.assertGreater(gaussian[0, 0], gaussian[0, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,8 @@
 """Tests for `dataprocess` package."""
 
 
+import os
+import tempfile
 import unittest
 import pandas as pd
 from hagerstrand import dataprocess
@@ -26,10 +28,154 @@ class TestDataProcess(unittest.TestCase):
         print("test_json_and_merge")
         self.assertIsInstance(dataprocess.unpack_json(self.in_csv), pd.DataFrame)
 
+    def test_unpack_json_columnar_matches_python(self):
+        print("test_unpack_json_columnar_matches_python")
+        for index_name in [None, "placekey"]:
+            columnar = dataprocess.unpack_json(self.in_csv2, index_name=index_name, engine="columnar")
+            python = dataprocess.unpack_json(self.in_csv2, index_name=index_name, engine="python")
+            pd.testing.assert_frame_equal(columnar, python)
+
     def test_unpack_json_and_merge(self):
         print("test_unpack_json_and_merge")
         self.assertIsInstance(dataprocess.unpack_json_and_merge(self.in_csv2), pd.DataFrame)
 
+    def test_unpack_json_n_jobs(self):
+        print("test_unpack_json_n_jobs")
+        serial = dataprocess.unpack_json(self.in_csv2, index_name="placekey")
+        parallel = dataprocess.unpack_json(self.in_csv2, index_name="placekey", n_jobs=2)
+        pd.testing.assert_frame_equal(parallel, serial)
+        # Partitions whose rows hold no pairs must not break the python engine
+        sparse_rows = pd.DataFrame({"visitor_home_cbgs": ['{"470930052013": 2}', "{}", None]})
+        serial = dataprocess.unpack_json(sparse_rows, engine="python")
+        parallel = dataprocess.unpack_json(sparse_rows, engine="python", n_jobs=3)
+        pd.testing.assert_frame_equal(parallel, serial)
+        self.assertEqual(len(parallel), 1)
+
+    def test_load_json_nan_backends(self):
+        print("test_load_json_nan_backends")
+        expected = dataprocess.load_json_nan(self.in_csv2, "related_same_day_brand", json_backend="json")
+        cached = dataprocess.load_json_nan(self.in_csv2, "related_same_day_brand", json_cache=128)
+        self.assertEqual(cached.tolist(), expected.tolist())
+
+    def test_deduplicate_hashed(self):
+        print("test_deduplicate_hashed")
+        months = pd.concat([self.in_csv.assign(date_range_end="2021-01"), self.in_csv.assign(date_range_end="2021-02")])
+        latest, report = dataprocess.deduplicate_hashed(
+            [months.iloc[:100], months.iloc[100:]], columns=["placekey"], keep="last", order_by="date_range_end"
+        )
+        expected = dataprocess.ExtendedDataFrame(months).deduplicate(["placekey"])
+        self.assertEqual(len(latest), len(expected))
+        self.assertEqual(report["n_dropped"].sum(), len(months) - len(expected))
+        self.assertTrue((latest["date_range_end"] == "2021-02").all())
+
+    def test_deduplicate_hashed_mixed_dtypes(self):
+        print("test_deduplicate_hashed_mixed_dtypes")
+        with tempfile.TemporaryDirectory() as root:
+            in_csvs = [os.path.join(root, "a.csv"), os.path.join(root, "b.csv")]
+            # naics_code is read as int64 from a.csv and as float64 from b.csv, which has a missing code
+            pd.DataFrame({"placekey": ["p1", "p2"], "naics_code": [445110, 722511]}).to_csv(in_csvs[0], index=False)
+            pd.DataFrame({"placekey": ["p1", "p3"], "naics_code": [445110, None]}).to_csv(in_csvs[1], index=False)
+            kept, report = dataprocess.deduplicate_hashed(in_csvs, columns=["placekey", "naics_code"], verbose=False)
+            self.assertListEqual(list(kept["placekey"]), ["p1", "p2", "p3"])
+            self.assertEqual(report["n_dropped"].sum(), 1)
+
+    def test_deduplicate_hashed_empty(self):
+        print("test_deduplicate_hashed_empty")
+        with tempfile.TemporaryDirectory() as root:
+            in_csv = os.path.join(root, "empty.csv")
+            pd.DataFrame({"placekey": [], "date_range_end": []}).to_csv(in_csv, index=False)
+            for data in ([in_csv], []):
+                kept, report = dataprocess.deduplicate_hashed(
+                    data, columns=["placekey"], order_by="date_range_end", chunksize=10, verbose=False
+                )
+                self.assertEqual(len(kept), 0)
+                self.assertListEqual(list(report.columns), ["placekey", "n_dropped"])
+
+    def test_unpack_json_and_merge_lazy(self):
+        print("test_unpack_json_and_merge_lazy")
+        merged = dataprocess.unpack_json_and_merge(self.in_csv2.copy())
+        join = dataprocess.unpack_json_and_merge(self.in_csv2, lazy=True)
+        self.assertIsInstance(join, dataprocess.UnpackedJoin)
+        self.assertEqual(len(join), len(merged))
+        pd.testing.assert_frame_equal(join.merge(), merged)
+
+    def test_unpack_json_chunked(self):
+        print("test_unpack_json_chunked")
+        in_csv = "examples/data/core_poi-patterns.csv"
+        chunks = dataprocess.unpack_json_chunked(in_csv, index_name="placekey", chunksize=50)
+        expected = dataprocess.unpack_json(pd.read_csv(in_csv), index_name="placekey")
+        pd.testing.assert_frame_equal(pd.concat(list(chunks)), expected)
+        parallel = dataprocess.unpack_json_chunked(in_csv, index_name="placekey", chunksize=50, n_jobs=2)
+        pd.testing.assert_frame_equal(pd.concat(list(parallel)), expected)
+
+    def test_visitor_matrix(self):
+        print("test_visitor_matrix")
+        matrix, rows, cols = dataprocess.visitor_matrix(self.in_csv2)
+        unpacked = dataprocess.unpack_json(self.in_csv2)
+        self.assertEqual(matrix.shape, (len(rows), len(cols)))
+        self.assertEqual(matrix.sum(), unpacked["visitor_home_cbgs_value"].sum())
+        in_csv = "examples/data/core_poi-patterns.csv"
+        whole, whole_rows, whole_cols = dataprocess.visitor_matrix(in_csv)
+        chunked, chunked_rows, chunked_cols = dataprocess.visitor_matrix(in_csv, chunksize=37)
+        self.assertTrue(chunked_rows.equals(whole_rows) and chunked_cols.equals(whole_cols))
+        self.assertEqual((chunked != whole).nnz, 0)
+
+    def test_jsoncol_array(self):
+        print("test_jsoncol_array")
+        df = dataprocess.ExtendedDataFrame(self.in_csv2)
+        hours, labels = df.jsoncol_array("popularity_by_hour")
+        self.assertEqual(hours.shape, (len(df), 24))
+        self.assertIsNone(labels)
+        days, labels = df.jsoncol_array("popularity_by_day")
+        self.assertEqual(labels[0], "Monday")
+        dwell = pd.DataFrame({"bucketed_dwell_times": ['{"<5": 1}', '{"<5": 3, "5-10": 4}', '{"5-10": 2}']})
+        values, labels = dataprocess.json_array(dwell, "bucketed_dwell_times")
+        self.assertListEqual(labels, ["<5", "5-10"])
+        self.assertListEqual(values.tolist(), [[1, 0], [3, 4], [0, 2]])
+
+    def test_unpack_json_compact(self):
+        print("test_unpack_json_compact")
+        unpacked = dataprocess.unpack_json(self.in_csv2)
+        compact = dataprocess.unpack_json(self.in_csv2, compact=True)
+        self.assertIsInstance(compact["visitor_home_cbgs_key"].dtype, pd.CategoricalDtype)
+        self.assertLess(compact.memory_usage(deep=True).sum(), unpacked.memory_usage(deep=True).sum())
+        self.assertEqual(compact["visitor_home_cbgs_value"].sum(), unpacked["visitor_home_cbgs_value"].sum())
+
+    def test_compact(self):
+        print("test_compact")
+        df = dataprocess.ExtendedDataFrame(self.in_csv2)
+        self.assertIsInstance(df.compact(), dataprocess.ExtendedDataFrame)
+
+    def test_patterns_panel(self):
+        print("test_patterns_panel")
+        in_csv = os.path.abspath("examples/data/core_poi-patterns.csv")
+        with tempfile.TemporaryDirectory() as root:
+            panel = dataprocess.PatternsPanel(root)
+            self.assertEqual(panel.ingest(in_csv), ["2020-03-01"])
+            self.assertEqual(panel.ingest(in_csv), [])
+            pois = panel.read_pois(start="2020-03", end="2020-03", columns=["placekey"])
+            self.assertEqual(len(pois), self.in_csv2["date_range_start"].notnull().sum())
+            cbgs = panel.read_cbgs(cbgs=["470930052013"])
+            self.assertTrue((cbgs["visitor_home_cbg"] == "470930052013").all())
+
+    def test_patterns_panel_months(self):
+        print("test_patterns_panel_months")
+        march = self.in_csv2[self.in_csv2["date_range_start"].notnull()].copy()
+        april = march.assign(date_range_start="2020-04-01T00:00:00-05:00", closed_on="2020-04-15")
+        # Counts read as int64 in March but as double in April, and closed_on is empty in March only
+        april.loc[april.index[0], "raw_visit_counts"] = None
+        with tempfile.TemporaryDirectory() as root:
+            in_csvs = [os.path.join(root, "march.csv"), os.path.join(root, "april.csv")]
+            march.to_csv(in_csvs[0])
+            april.to_csv(in_csvs[1])
+            panel = dataprocess.PatternsPanel(os.path.join(root, "panel"))
+            self.assertEqual(panel.ingest(in_csvs), ["2020-03-01", "2020-04-01"])
+            pois = panel.read_pois()
+            self.assertEqual(len(pois), 2 * len(march))
+            self.assertEqual(pois["raw_visit_counts"].isna().sum(), 1)
+            self.assertEqual(pois["closed_on"].notnull().sum(), len(april))
+            self.assertEqual(panel.read_cbgs(start="2020-04")["date_range_start"].unique().tolist(), ["2020-04-01"])
+
 #    def test_unique_sorted_columns_plus_ALL(self):
 #        print("test_unique_sorted_columns_plus_ALL")
 #        self.assertIsInstance(dataprocess.unique_sorted_columns_plus_ALL(self.in_shp, 6576, True, 4326), list)
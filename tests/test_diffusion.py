@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+"""Tests for `diffusion` package."""
+
+import unittest
+import numpy as np
+import geopandas as gpd
+from hagerstrand import diffusion
+
+
+class TestDiffusion(unittest.TestCase):
+    """Tests for `diffusion` package."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        print("setUp")
+        rng = np.random.default_rng(0)
+        coords = rng.uniform(0, 10000, size=(40, 2))
+        self.gdf = gpd.GeoDataFrame(
+            {"population": rng.integers(50, 500, 40), "adopters": 0},
+            geometry=gpd.points_from_xy(*coords.T),
+            crs=6576,
+        )
+        self.gdf.loc[0, "adopters"] = 3
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        print("tearDown\n")
+
+    def test_mean_information_field(self):
+        print("test_mean_information_field")
+        distances = np.array([[0, 1, 4], [1, 0, 3], [4, 3, 0]])
+        field = diffusion.mean_information_field(distances, kernel="exponential", beta=1.0, radius=3)
+        np.testing.assert_allclose(field.sum(axis=1), 1)
+        self.assertEqual(field[0, 2], 0)
+        self.assertGreater(field[0, 0], field[0, 1])
+
+    def test_run_and_replicate(self):
+        print("test_run_and_replicate")
+        model = diffusion.DiffusionModel(self.gdf, "population", "adopters", metric="euclidean")
+        history = model.run(15, seed=1)
+        self.assertEqual(history.shape, (16, 40))
+        self.assertTrue((history.diff().iloc[1:] >= 0).all().all())
+        self.assertTrue((history.iloc[-1] <= self.gdf["population"]).all())
+        self.assertGreater(history.iloc[-1].sum(), history.iloc[0].sum())
+        serial = model.replicate(3, 10, seed=7)
+        parallel = model.replicate(3, 10, seed=7, n_jobs=2)
+        np.testing.assert_array_equal(serial, parallel)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,8 +3,12 @@
 """Tests for `hagerstrand` package."""
 
 import os
+import json
+import tempfile
 import unittest
+import pandas as pd
 import geopandas as gpd
+import shapely
 from hagerstrand import hagerstrand, dataprocess
 
 
@@ -26,10 +30,61 @@ class TestHagerstrand(unittest.TestCase):
         print("test_shp_to_geojson")
         self.assertIsInstance(hagerstrand.shp_to_geojson(self.in_shp), dict)
     
+    def test_geo_columnar_roundtrip(self):
+        print("test_geo_columnar_roundtrip")
+        out_dir = tempfile.mkdtemp()
+        polygons = gpd.read_file(self.in_shp)
+        selected = polygons["GEOID"] >= "470930050000"
+        for name in ["bg.parquet", "bg.feather"]:
+            out_file = os.path.join(out_dir, name)
+            hagerstrand.shp_to_geojson(self.in_shp, out_file)
+            subset = hagerstrand.read_geo(out_file, columns=["GEOID"], filters=[("GEOID", ">=", "470930050000")])
+            self.assertListEqual(list(subset.columns), ["GEOID", "geometry"])
+            self.assertListEqual(list(subset["GEOID"]), list(polygons.loc[selected, "GEOID"]))
+            self.assertEqual(subset.crs.to_epsg(), 6576)
+            bbox = (2550000, 580000, 2600000, 620000)
+            self.assertEqual(len(hagerstrand.read_geo(out_file, bbox=bbox)), polygons.intersects(shapely.geometry.box(*bbox)).sum())
+        out_points = os.path.join(out_dir, "poi.parquet")
+        hagerstrand.csv_to_shp(self.in_csv, out_points, columns=["placekey"])
+        self.assertListEqual(list(hagerstrand.read_geo(out_points).columns), ["placekey", "latitude", "longitude", "geometry"])
+        geojson = hagerstrand.csv_to_geojson(out_points, columns=["placekey"], filters=[("latitude", ">", 36)])
+        self.assertTrue(all(feature["properties"]["latitude"] > 36 for feature in geojson["features"]))
+
     def test_gmapjson_to_geojson(self):
         print("test_gmapjson_to_geojson")
         self.assertIsInstance(hagerstrand.gmapjson_to_geojson(self.in_gmapjson), dict)
 
+    def test_gmapjson_to_file(self):
+        print("test_gmapjson_to_file")
+        batches = list(hagerstrand.iter_gmapjson(self.in_gmapjson, batch_size=1000, buffer_size=100))
+        self.assertListEqual([len(batch) for batch in batches], [1000] * 5 + [496])
+        out_dir = tempfile.mkdtemp()
+        out_geojson = os.path.join(out_dir, "locations.geojson")
+        hagerstrand.gmapjson_to_file(self.in_gmapjson, out_geojson, batch_size=1000)
+        with open(out_geojson) as f:
+            self.assertEqual(json.load(f), hagerstrand.gmapjson_to_geojson(self.in_gmapjson))
+        for name in ["locations.parquet", "locations.geoparquet", "locations.feather"]:
+            out_file = os.path.join(out_dir, name)
+            hagerstrand.gmapjson_to_file(self.in_gmapjson, out_file, batch_size=1000)
+            locations = hagerstrand.read_geo(out_file)
+            self.assertEqual(len(locations), 5496)
+            self.assertEqual(locations.crs.to_epsg(), 4326)
+            self.assertAlmostEqual(locations["latitude"].iloc[0], 35.9563627)
+        out_geoparquet = os.path.join(out_dir, "converted.geoparquet")
+        hagerstrand.gmapjson_to_geojson(self.in_gmapjson, out_geoparquet)
+        self.assertEqual(len(hagerstrand.read_geo(out_geoparquet)), 5496)
+
+    def test_gmapjson_to_gdf(self):
+        print("test_gmapjson_to_gdf")
+        locations = hagerstrand.gmapjson_to_gdf(self.in_gmapjson, batch_size=1000)
+        self.assertEqual(len(locations), 5496)
+        self.assertIsInstance(locations["timestamp"].dtype, pd.DatetimeTZDtype)
+        self.assertEqual(str(locations["timestamp"].dt.tz), "UTC")
+        self.assertAlmostEqual(locations.geometry.y.iloc[0], 35.9563627)
+        day = hagerstrand.gmapjson_to_gdf(self.in_gmapjson, start="2020-02-06", end="2020-02-07", activity=False)
+        self.assertTrue(((day["timestamp"] >= "2020-02-06") & (day["timestamp"] < "2020-02-07")).all())
+        self.assertEqual(len(day), ((locations["timestamp"] >= "2020-02-06") & (locations["timestamp"] < "2020-02-07")).sum())
+
     def test_poly_centroid(self):
         print("test_poly_centroid")
         self.assertIsInstance(hagerstrand.poly_centroid(self.in_shp, 6576, True, 4326), gpd.GeoDataFrame)
@@ -38,6 +93,40 @@ class TestHagerstrand(unittest.TestCase):
         print("test_csv_to_gdf")
         self.assertIsInstance(hagerstrand.csv_to_gdf(in_csv=self.in_csv, index_col=0), gpd.GeoDataFrame)
 
+    def test_csv_to_gdf_chunked(self):
+        print("test_csv_to_gdf_chunked")
+        whole = hagerstrand.csv_to_gdf(in_csv=self.in_csv, index_col=0)
+        chunked = hagerstrand.csv_to_gdf(in_csv=self.in_csv, index_col="safegraph_place_id", usecols=["placekey"], chunksize=50)
+        self.assertListEqual(list(chunked.columns), ["placekey", "latitude", "longitude", "ycoord", "xcoord", "geometry"])
+        self.assertEqual(chunked.crs.to_epsg(), 6576)
+        self.assertTrue(chunked.geometry.geom_equals_exact(whole.set_index("safegraph_place_id").geometry, tolerance=1e-6).all())
+        self.assertIs(hagerstrand.get_transformer(4326, 6576), hagerstrand.get_transformer(4326, 6576))
+
+    def test_nearest_neighbor_haversine(self):
+        print("test_nearest_neighbor_haversine")
+        origins = hagerstrand.poly_centroid(self.in_shp, 6576, True, 6576)
+        stores = hagerstrand.csv_to_gdf(in_csv=self.in_csv, index_col=0)
+        feet = hagerstrand.nearest_neighbor(origins, stores, return_dist=True)
+        miles = hagerstrand.nearest_neighbor(origins, stores, metric="haversine", return_dist=True)
+        self.assertEqual(len(miles), len(origins))
+        self.assertAlmostEqual(miles["distance"].mean(), feet["distance"].mean() / 5280, places=1)
+        # A prebuilt index must measure distance with the metric asked for
+        feet_index = hagerstrand.SpatialIndex.from_gdf(stores)
+        with self.assertRaises(ValueError):
+            hagerstrand.nearest_neighbor(origins, stores, metric="haversine", index=feet_index)
+        with self.assertRaises(ValueError):
+            hagerstrand.radius_neighbors(origins, stores, 1, metric="haversine", index=feet_index)
+
+    def test_k_nearest_neighbors(self):
+        print("test_k_nearest_neighbors")
+        origins = hagerstrand.poly_centroid(self.in_shp, 6576, True, 6576)
+        stores = hagerstrand.csv_to_gdf(in_csv=self.in_csv, index_col=0)
+        knn = hagerstrand.k_nearest_neighbors(origins, stores, k_neighbors=3, left_id="GEOID")
+        self.assertEqual(len(knn), 3 * len(origins))
+        self.assertTrue((knn.groupby("origin_id")["distance"].diff().dropna() >= 0).all())
+        near = hagerstrand.k_nearest_neighbors(origins, stores, k_neighbors=50, max_distance=5280)
+        self.assertTrue((near["distance"] <= 5280).all())
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+"""Tests for `spatial` package."""
+
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from hagerstrand import hagerstrand, spatial
+
+
+class TestSpatial(unittest.TestCase):
+    """Tests for `spatial` package."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        print("setUp")
+        rng = np.random.default_rng(0)
+        self.origins = rng.uniform(0, 1000, size=(200, 2))
+        self.candidates = rng.uniform(0, 1000, size=(50, 2))
+        spatial.clear_spatial_index_cache()
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        print("tearDown\n")
+
+    def test_get_spatial_index_reuses_tree(self):
+        print("test_get_spatial_index_reuses_tree")
+        first = spatial.get_spatial_index(self.candidates)
+        self.assertIs(spatial.get_spatial_index(self.candidates.copy()), first)
+        self.assertIsNot(spatial.get_spatial_index(self.candidates, tree="kd"), first)
+
+    def test_spatial_index_save_load(self):
+        print("test_spatial_index_save_load")
+        index = spatial.SpatialIndex(self.candidates, leaf_size=30)
+        with tempfile.TemporaryDirectory() as tmp:
+            index.save(os.path.join(tmp, "stores.idx"))
+            loaded = spatial.SpatialIndex.load(os.path.join(tmp, "stores.idx"))
+        np.testing.assert_array_equal(loaded.query(self.origins)[1], index.query(self.origins)[1])
+
+    def test_query_radius(self):
+        print("test_query_radius")
+        index = spatial.SpatialIndex(self.candidates)
+        indptr, indices, distances = index.query_radius(self.origins, 150)
+        brute = np.hypot(*(self.origins[:, None, :] - self.candidates[None, :, :]).transpose(2, 0, 1))
+        np.testing.assert_array_equal(np.diff(indptr), (brute <= 150).sum(axis=1))
+        np.testing.assert_array_equal(index.query_radius(self.origins, 150, count_only=True), np.diff(indptr))
+        self.assertTrue((distances <= 150).all())
+
+    def test_parallel_query(self):
+        print("test_parallel_query")
+        index = spatial.SpatialIndex(self.candidates)
+        chunks = [self.origins[:70], self.origins[70:140], self.origins[140:]]
+        results = list(spatial.parallel_query(index, iter(chunks), k=3, n_jobs=2))
+        distances = np.concatenate([result[0] for result in results])
+        np.testing.assert_array_equal(distances, index.query(self.origins, k=3)[0])
+
+    def test_nearest_neighbor_chunked(self):
+        print("test_nearest_neighbor_chunked")
+        left = gpd.GeoDataFrame({"id": np.arange(200) * 10}, geometry=gpd.points_from_xy(*self.origins.T), crs=6576)
+        right = gpd.GeoDataFrame(geometry=gpd.points_from_xy(*self.candidates.T), crs=6576, index=np.arange(50) + 1000)
+        with tempfile.TemporaryDirectory() as tmp:
+            out_csv = os.path.join(tmp, "nearest.csv")
+            hagerstrand.nearest_neighbor_chunked(left, right, out_csv, k_neighbors=3, left_id="id", chunksize=37, n_jobs=2)
+            expected = hagerstrand.k_nearest_neighbors(left, right, k_neighbors=3, left_id="id")
+            pd.testing.assert_frame_equal(pd.read_csv(out_csv), expected)
+
+            # An iterable of chunks, with distances scaled to miles for haversine
+            chunks = (left.iloc[start:start + 50] for start in range(0, len(left), 50))
+            hagerstrand.nearest_neighbor_chunked(chunks, right, out_csv, k_neighbors=2, metric="haversine", n_jobs=2)
+            expected = hagerstrand.k_nearest_neighbors(left, right, k_neighbors=2, metric="haversine")
+            miles = pd.read_csv(out_csv)
+            pd.testing.assert_frame_equal(miles, expected)
+            feet = hagerstrand.k_nearest_neighbors(left, right, k_neighbors=2)
+            np.testing.assert_allclose(miles["distance"], feet["distance"] / 5280, rtol=1e-2)
+
+    def test_distance_matrix(self):
+        print("test_distance_matrix")
+        left = gpd.GeoDataFrame(geometry=gpd.points_from_xy(*self.origins.T), crs=6576)
+        right = gpd.GeoDataFrame(geometry=gpd.points_from_xy(*self.candidates.T), crs=6576)
+        matrix = spatial.distance_matrix(left, right, metric="euclidean", block_size=16)
+        brute = np.hypot(*(self.origins[:, None, :] - self.candidates[None, :, :]).transpose(2, 0, 1))
+        self.assertEqual(matrix.dtype, np.float32)
+        np.testing.assert_allclose(matrix, brute, rtol=1e-6)
+        lonlat = left.to_crs(4326)
+        haversine = spatial.distance_matrix(lonlat, lonlat.iloc[:5], dtype="float64")
+        great_circle = spatial.distance_matrix(lonlat, lonlat.iloc[:5], metric="great_circle", dtype="float64")
+        np.testing.assert_allclose(haversine, great_circle, atol=1e-6)
+
+    def test_polygon_index(self):
+        print("test_polygon_index")
+        polygons = gpd.read_file(os.path.join("examples", "data", "KnoxCountyBlockGroup.shp"))
+        index = spatial.PolygonIndex(polygons, columns=["GEOID"])
+        inside = polygons.representative_point()
+        attributes = index.query(gpd.GeoDataFrame(geometry=inside).to_crs(4326))
+        self.assertListEqual(list(attributes["GEOID"]), list(polygons["GEOID"]))
+        # A shared vertex goes to the first polygon; far away points match nothing
+        vertex = np.array(polygons.geometry.iloc[0].exterior.coords[1:2])
+        outside = polygons.total_bounds[:2][None, :] - 1000
+        np.testing.assert_array_equal(index.locate(np.vstack([vertex, outside])), [0, -1])
+        out_file = os.path.join(tempfile.mkdtemp(), "bg.idx")
+        index.save(out_file)
+        self.assertEqual(len(spatial.PolygonIndex.load(out_file)), len(polygons))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+"""Tests for `trajectory` package."""
+
+import unittest
+import numpy as np
+import pandas as pd
+from hagerstrand import trajectory
+
+
+class TestTrajectory(unittest.TestCase):
+    """Tests for `trajectory` package."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        print("setUp")
+        # Half an hour at home, a 10 minute drive of about 5 km and half an hour at a store, one ping a minute
+        minutes = np.arange(71)
+        lat = np.concatenate([np.full(30, 35.96), np.linspace(35.96, 36.005, 11), np.full(30, 36.005)])
+        trace = pd.DataFrame({
+            "timestamp": pd.Timestamp("2020-02-06", tz="UTC") + pd.to_timedelta(minutes, unit="min"),
+            "latitude": lat,
+            "longitude": np.full(71, -83.92),
+        })
+        # A second user with the same trace an hour later, shuffled in with the first
+        self.pings = pd.concat([trace.assign(user="a"), trace.assign(user="b", timestamp=trace["timestamp"] + pd.Timedelta("1h"))])
+        self.pings = self.pings.sample(frac=1, random_state=0).reset_index(drop=True)
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        print("tearDown\n")
+
+    def test_stay_points_and_trips(self):
+        print("test_stay_points_and_trips")
+        stays = trajectory.stay_points(self.pings, user_col="user")
+        self.assertListEqual(list(stays["user"]), ["a", "a", "b", "b"])
+        self.assertListEqual(list(stays["n_points"]), [31, 31, 31, 31])
+        np.testing.assert_allclose(stays["latitude"], [35.96, 36.005] * 2)
+        trips = trajectory.segment_trips(self.pings, user_col="user")
+        self.assertListEqual(list(trips["origin_stay"]), [0, 2])
+        self.assertListEqual(list(trips["destination_stay"]), [1, 3])
+        self.assertTrue(np.allclose(trips["length"], trips["length"].iloc[0]))
+        labelled = trajectory.label_trajectory(self.pings, user_col="user")
+        self.assertEqual((labelled["trip_id"] >= 0).sum(), 2 * 9)
+
+    def test_slow_walk_into_stay(self):
+        print("test_slow_walk_into_stay")
+        # A 20 minute walk with steps of about 84 m, shorter than the distance threshold, then two hours standing still
+        steps = np.concatenate([np.arange(21), np.full(120, 20)])
+        walk = pd.DataFrame({
+            "timestamp": pd.Timestamp("2020-02-06", tz="UTC") + pd.to_timedelta(np.arange(141), unit="min"),
+            "latitude": 35.96 + steps * 84 / 111195,
+            "longitude": np.full(141, -83.92),
+        })
+        stays = trajectory.stay_points(walk)
+        self.assertEqual(len(stays), 1)
+        self.assertEqual(stays["start"].iloc[0], pd.Timestamp("2020-02-06 00:18", tz="UTC"))
+        self.assertEqual(stays["n_points"].iloc[0], 123)
+        trips = trajectory.segment_trips(walk)
+        self.assertListEqual(list(trips["n_points"]), [18])
+        self.assertListEqual(list(trips["destination_stay"]), [0])
+
+    def test_filter_speed_outliers(self):
+        print("test_filter_speed_outliers")
+        jump = self.pings.copy()
+        first_a = jump.index[(jump["user"] == "a") & (jump["timestamp"] == pd.Timestamp("2020-02-06 00:10", tz="UTC"))][0]
+        jump.loc[first_a, "latitude"] += 1
+        filtered = trajectory.filter_speed_outliers(jump, user_col="user")
+        self.assertEqual(len(filtered), len(jump) - 1)
+        self.assertNotIn(first_a, filtered.index)
+
+    def test_resample(self):
+        print("test_resample")
+        resampled = trajectory.resample(self.pings, "30s", user_col="user")
+        self.assertEqual(len(resampled), 2 * 141)
+        first = resampled[resampled["user"] == "a"]
+        np.testing.assert_allclose(first["latitude"].iloc[61], (35.96 + 35.9645) / 2)
+        previous = trajectory.resample(self.pings, "30s", user_col="user", method="previous")
+        self.assertAlmostEqual(previous["latitude"].iloc[61], 35.96)
+        gaps = trajectory.resample(self.pings.iloc[::3], "1min", user_col="user", max_gap="1min")
+        self.assertTrue(gaps["latitude"].isna().any())
+
+
+if __name__ == '__main__':
+    unittest.main()